@@ -1,7 +1,10 @@
 from pinecone import Pinecone, ServerlessSpec
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Union
+from concurrent.futures import Future
+import json
 import logging
+import threading
 from dotenv import load_dotenv
 import time
 
@@ -26,6 +29,9 @@ class PineconeClient:
             self.index_name = None
             self.pc = None
             self.index = None
+            # Identical queries already on the wire, shared by concurrent callers
+            self._inflight_queries: Dict[tuple, Future] = {}
+            self._inflight_lock = threading.Lock()
     
     def initialize(self):
         """Initialize Pinecone connection once at startup"""
@@ -77,7 +83,7 @@ class PineconeClient:
             logger.error(f"Failed to initialize Pinecone: {e}")
             raise
     
-    def upsert_vectors(self, vectors: List[Dict[str, Any]], namespace: str):
+    def upsert_vectors(self, vectors: List[Union[Dict[str, Any], tuple]], namespace: str):
         """Upsert vectors to Pinecone with tenant namespace"""
         if not self._initialized:
             raise RuntimeError("Pinecone client not initialized. Call initialize() first.")
@@ -97,6 +103,32 @@ class PineconeClient:
         """Query vectors from Pinecone with tenant namespace"""
         if not self._initialized:
             raise RuntimeError("Pinecone client not initialized. Call initialize() first.")
+        
+        # Concurrent requests for the same vector (e.g. users asking the same question at once)
+        # ride on a single Pinecone round-trip instead of each paying for their own
+        key = (namespace, top_k, json.dumps(filter_dict, sort_keys=True), tuple(query_vector))
+        with self._inflight_lock:
+            future = self._inflight_queries.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight_queries[key] = Future()
+        if not owner:
+            logger.info(f"🌲 Joining in-flight Pinecone query for namespace '{namespace}'")
+            return future.result()
+        
+        try:
+            response = self._query(query_vector, namespace, top_k, filter_dict)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(response)
+            return response
+        finally:
+            with self._inflight_lock:
+                self._inflight_queries.pop(key, None)
+    
+    def _query(self, query_vector: List[float], namespace: str, top_k: int, filter_dict: Dict):
         try:
             pinecone_start = time.time()
             logger.info(f"🌲 Querying Pinecone index '{self.index_name}' namespace '{namespace}' with top_k={top_k}...")
@@ -114,6 +146,29 @@ class PineconeClient:
             logger.error(f"💥 Failed to query vectors: {e}")
             raise
     
+    def list_vector_ids(self, namespace: str, prefix: str = None):
+        """Yield pages of vector IDs in a namespace (optionally by ID prefix)"""
+        if not self._initialized:
+            raise RuntimeError("Pinecone client not initialized. Call initialize() first.")
+        try:
+            kwargs = {"namespace": namespace}
+            if prefix:
+                kwargs["prefix"] = prefix
+            yield from self.index.list(**kwargs)
+        except Exception as e:
+            logger.error(f"Failed to list vectors: {e}")
+            raise
+    
+    def fetch_vectors(self, ids: List[str], namespace: str):
+        """Fetch vectors (values + metadata) by ID"""
+        if not self._initialized:
+            raise RuntimeError("Pinecone client not initialized. Call initialize() first.")
+        try:
+            return self.index.fetch(ids=ids, namespace=namespace)
+        except Exception as e:
+            logger.error(f"Failed to fetch vectors: {e}")
+            raise
+    
     def delete_vectors(self, ids: List[str], namespace: str):
         """Delete vectors from Pinecone"""
         if not self._initialized:
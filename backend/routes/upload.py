@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
 from fastapi.responses import JSONResponse, StreamingResponse
 from typing import List
+import asyncio
 import logging
 import io
 from bson import ObjectId
@@ -63,7 +64,7 @@ async def upload_document(
             )
         
         # Process document with RAG pipeline
-        doc_id = rag_pipeline.process_document(
+        doc_id = await rag_pipeline.process_document_async(
             file_path=file_path,
             file_name=file.filename,
             file_content=file_content,
@@ -165,6 +166,7 @@ async def upload_multiple_documents(
         
         results = []
         errors = []
+        uploaded = []
         
         for file in files:
             try:
@@ -190,23 +192,39 @@ async def upload_multiple_documents(
                     errors.append(f"{file.filename}: Failed to upload to storage")
                     continue
                 
+                uploaded.append((file.filename, file_content, file_path))
+                
+            except Exception as e:
+                errors.append(f"{file.filename}: {str(e)}")
+        
+        # Extract every file in one batch: document parsing overlaps the Gemini media calls
+        texts = await file_processor.extract_text_batch(
+            [(filename, file_content) for filename, file_content, _ in uploaded])
+        
+        for (filename, file_content, file_path), text_content in zip(uploaded, texts):
+            try:
+                if not text_content:
+                    errors.append(f"{filename}: No text content extracted from file")
+                    continue
+                
                 # Process document
-                doc_id = rag_pipeline.process_document(
+                doc_id = await rag_pipeline.process_document_async(
                     file_path=file_path,
-                    file_name=file.filename,
+                    file_name=filename,
                     file_content=file_content,
                     tenant_id=current_user["tenant_id"],
-                    user_id=str(current_user["_id"])
+                    user_id=str(current_user["_id"]),
+                    text_content=text_content
                 )
                 
                 results.append({
-                    "filename": file.filename,
+                    "filename": filename,
                     "document_id": doc_id,
                     "status": "success"
                 })
                 
             except Exception as e:
-                errors.append(f"{file.filename}: {str(e)}")
+                errors.append(f"{filename}: {str(e)}")
         
         return {
             "message": f"Processed {len(results)} files successfully",
@@ -310,7 +328,7 @@ async def preview_document(
             )
         
         # Return preview information with full text if available
-        full_text = document.get("full_text", "")
+        full_text = await asyncio.to_thread(rag_pipeline.get_full_text, doc_id, current_user["tenant_id"], document)
         text_preview = full_text if full_text else document.get("text_preview", "")
         
         preview_data = {
@@ -0,0 +1,35 @@
+from typing import List, Optional
+import logging
+
+from db.pinecone_client import pinecone_client
+
+logger = logging.getLogger(__name__)
+
+FETCH_BATCH_SIZE = 100
+
+def rebuild_document_text(tenant_id: str, doc_id: str, max_overlap: int) -> Optional[str]:
+    """A document's text stitched back together from every one of its chunks in Pinecone"""
+    chunks = []
+    # Vector IDs are "{tenant_id}_{doc_id}_{chunk_index}", so one prefix listing pages through them all
+    for page in pinecone_client.list_vector_ids(namespace=tenant_id, prefix=f"{tenant_id}_{doc_id}_"):
+        for offset in range(0, len(page), FETCH_BATCH_SIZE):
+            response = pinecone_client.fetch_vectors(page[offset:offset + FETCH_BATCH_SIZE], tenant_id)
+            for vector in response.vectors.values():
+                metadata = vector.metadata or {}
+                if metadata.get("doc_id") == doc_id:
+                    chunks.append((metadata.get("chunk_index", 0), metadata.get("text", "")))
+    
+    if not chunks:
+        return None
+    chunks.sort(key=lambda chunk: chunk[0])
+    logger.info(f"📄 Rebuilt {doc_id} from {len(chunks)} chunks")
+    return stitch_chunks([text for _, text in chunks], max_overlap)
+
+def stitch_chunks(chunks: List[str], max_overlap: int) -> str:
+    """Join consecutive chunks, dropping the up-to-max_overlap characters adjacent chunks share"""
+    parts = [chunks[0]]
+    for previous, chunk in zip(chunks, chunks[1:]):
+        overlap = next((size for size in range(min(max_overlap, len(previous), len(chunk)), 0, -1)
+                        if previous.endswith(chunk[:size])), 0)
+        parts.append(chunk[overlap:] if overlap else "\n" + chunk)
+    return "".join(parts)
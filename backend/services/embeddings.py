@@ -1,30 +1,73 @@
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from typing import List
+from typing import List, Tuple
+from concurrent.futures import Future
 import os
 import logging
+import queue
+import threading
 import time
 
 logger = logging.getLogger(__name__)
 
+# Query embeddings requested while a call is in flight share the next batchEmbedContents call
+QUERY_BATCH_SIZE = 32
+QUERY_BATCH_WORKERS = 2
+# Upper bound on waiting for a batched query embedding, so a stuck worker can't hang a request
+QUERY_EMBED_TIMEOUT_SECONDS = 30
+
 class EmbeddingService:
     def __init__(self):
         self.embeddings = GoogleGenerativeAIEmbeddings(
             model="models/embedding-001",
             google_api_key=os.getenv("GOOGLE_API_KEY")
         )
+        self._query_queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        # Batch workers start on the first query, not at import
+        self._workers_started = False
+        self._workers_lock = threading.Lock()
     
     def embed_text(self, text: str) -> List[float]:
-        """Generate embedding for a single text"""
-        try:
-            embed_start = time.time()
-            logger.info(f"🧠 Calling Google Embedding API for {len(text)} characters...")
-            embedding = self.embeddings.embed_query(text)
-            embed_time = (time.time() - embed_start) * 1000
-            logger.info(f"✅ Google Embedding API responded in {embed_time:.2f}ms - Generated {len(embedding)} dimensions")
-            return embedding
-        except Exception as e:
-            logger.error(f"💥 Failed to generate embedding: {e}")
-            raise
+        """Generate embedding for a single text (query), batched with concurrent callers"""
+        self._start_query_workers()
+        future: Future = Future()
+        self._query_queue.put((text, future))
+        return future.result(timeout=QUERY_EMBED_TIMEOUT_SECONDS)
+    
+    def _start_query_workers(self):
+        if self._workers_started:
+            return
+        with self._workers_lock:
+            if not self._workers_started:
+                for _ in range(QUERY_BATCH_WORKERS):
+                    threading.Thread(target=self._query_batch_worker, daemon=True).start()
+                self._workers_started = True
+    
+    def _query_batch_worker(self):
+        """Embed whatever queries are waiting in one call; an idle worker dispatches a lone query at once"""
+        while True:
+            batch = [self._query_queue.get()]
+            while len(batch) < QUERY_BATCH_SIZE:
+                try:
+                    batch.append(self._query_queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            try:
+                embed_start = time.time()
+                logger.info(f"🧠 Calling Google Embedding API for {len(batch)} queries...")
+                embeddings = self.embeddings.embed_documents([text for text, _ in batch], task_type="retrieval_query")
+                if len(embeddings) != len(batch):
+                    raise ValueError(f"Expected {len(batch)} embeddings, got {len(embeddings)}")
+                embed_time = (time.time() - embed_start) * 1000
+                logger.info(f"✅ Google Embedding API responded in {embed_time:.2f}ms - Generated {len(embeddings)} embeddings")
+            except Exception as e:
+                logger.error(f"💥 Failed to generate embedding: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
     
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings for multiple texts"""
@@ -39,6 +82,19 @@ class EmbeddingService:
         except Exception as e:
             logger.error(f"💥 Failed to generate embeddings: {e}")
             raise
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for multiple texts without blocking the event loop"""
+        try:
+            batch_start = time.time()
+            logger.info(f"🧠 Calling Google Embedding API (async) for {len(texts)} documents...")
+            embeddings = await self.embeddings.aembed_documents(texts)
+            batch_time = (time.time() - batch_start) * 1000
+            logger.info(f"✅ Google Embedding API batch responded in {batch_time:.2f}ms - Generated {len(embeddings)} embeddings")
+            return embeddings
+        except Exception as e:
+            logger.error(f"💥 Failed to generate embeddings: {e}")
+            raise
 
 # Global embedding service instance
 embedding_service = EmbeddingService()
\ No newline at end of file
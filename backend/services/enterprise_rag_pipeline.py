@@ -2,14 +2,14 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.schema import HumanMessage, SystemMessage
 from typing import List, Dict, Any, Optional, Tuple
-import uuid
+import asyncio
 import logging
 from datetime import datetime
 import os
 import time
 import re
 import numpy as np
-from collections import defaultdict
+from collections import Counter, defaultdict
 
 from db.pinecone_client import pinecone_client
 from db.mongodb_client import DocumentModel, ChatHistoryModel
@@ -19,9 +19,20 @@ from smart_performance_monitor import log_performance
 from config.enterprise_config import enterprise_config
 from services.entity_extraction import entity_extraction_service
 from services.rich_content_generator import rich_content_generator
+from services.document_text import rebuild_document_text
 
 logger = logging.getLogger(__name__)
 
+# Ingestion pipeline: chunks are embedded in batches and each batch is upserted as soon as
+# it resolves, so embedding latency and Pinecone round-trips overlap instead of stacking
+EMBEDDING_BATCH_SIZE = 200
+UPSERT_BATCH_SIZE = 100
+MAX_INFLIGHT_BATCHES = 5
+# Pinecone accepts at most 1000 IDs per delete call
+DELETE_BATCH_SIZE = 1000
+# Structured files: their chunks are summaries, so the full text is kept on the document record
+STRUCTURED_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
 class EnterpriseRAGPipeline:
     def __init__(self):
         # Load enterprise configuration
@@ -73,10 +84,22 @@ class EnterpriseRAGPipeline:
         
     def process_document(self, file_path: str, file_name: str, 
                         file_content: bytes, tenant_id: str, user_id: str) -> str:
-        """Enterprise document processing with advanced chunking"""
+        """Enterprise document processing for synchronous callers (async routes await process_document_async)"""
+        return asyncio.run(self.process_document_async(file_path, file_name, file_content, tenant_id, user_id))
+    
+    async def process_document_async(self, file_path: str, file_name: str, 
+                                     file_content: bytes, tenant_id: str, user_id: str,
+                                     text_content: Optional[str] = None) -> str:
+        """Enterprise document processing with embedding batches pipelined into Pinecone upserts.
+        
+        text_content skips extraction when the caller already extracted the file (bulk uploads).
+        """
+        doc_id = None
+        vector_ids = []
         try:
             # Extract text from file
-            text_content = file_processor.extract_text(file_name, file_content)
+            if text_content is None:
+                text_content = await asyncio.to_thread(file_processor.extract_text, file_name, file_content)
             if not text_content:
                 raise ValueError("No text content extracted from file")
             
@@ -84,49 +107,17 @@ class EnterpriseRAGPipeline:
             processed_text = self._preprocess_text(text_content)
             
             # Advanced chunking with document structure awareness
-            chunks = self._advanced_chunking(processed_text, file_name)
+            chunks = await asyncio.to_thread(self._advanced_chunking, processed_text, file_name)
             logger.info(f"Split document into {len(chunks)} enterprise-grade chunks")
             
             # Extract entities from document
             entity_extraction_start = time.time()
             document_type = self._detect_document_type(file_name, text_content)
-            entity_data = entity_extraction_service.extract_entities_from_chunks(chunks, document_type)
+            entity_data = await asyncio.to_thread(entity_extraction_service.extract_entities_from_chunks, chunks, document_type)
             entity_extraction_time = (time.time() - entity_extraction_start) * 1000
             logger.info(f"✅ Entity extraction completed in {entity_extraction_time:.2f}ms")
             
-            # Generate embeddings for chunks
-            embeddings = embedding_service.embed_documents([chunk['text'] for chunk in chunks])
-            
-            # Prepare vectors for Pinecone with enhanced metadata
-            vectors = []
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                vector_id = f"{tenant_id}_{file_name}_{i}_{uuid.uuid4().hex[:8]}"
-                vectors.append({
-                    "id": vector_id,
-                    "values": embedding,
-                    "metadata": {
-                        "tenant_id": tenant_id,
-                        "file_name": file_name,
-                        "file_path": file_path,
-                        "chunk_index": i,
-                        "text": chunk['text'],
-                        "chunk_type": chunk['type'],
-                        "section_title": chunk.get('section_title', ''),
-                        "page_number": chunk.get('page_number', 0),
-                        "word_count": chunk['word_count'],
-                        "uploaded_by": user_id,
-                        "upload_date": datetime.utcnow().isoformat(),
-                        "document_type": document_type,
-                        # Add entity information to chunk metadata (Pinecone-compatible format)
-                        "entity_count": len([e for e in entity_data['entities'] if e.get('chunk_index') == i]),
-                        "enterprise_entity_types": list(entity_data['enterprise_entities'].keys()),
-                        "has_financial_terms": "financial_terms" in entity_data['enterprise_entities'],
-                        "has_technical_terms": "technical_terms" in entity_data['enterprise_entities'],
-                        "has_legal_terms": "legal_terms" in entity_data['enterprise_entities']
-                    }
-                })
-            
-            # Store document metadata in MongoDB
+            # Store document metadata in MongoDB first so every vector carries doc_id as soon as it is embedded
             doc_metadata = {
                 "tenant_id": tenant_id,
                 "file_name": file_name,
@@ -136,7 +127,6 @@ class EnterpriseRAGPipeline:
                 "uploaded_by": user_id,
                 "document_type": document_type,
                 "text_preview": text_content[:1000] + "..." if len(text_content) > 1000 else text_content,
-                "full_text": text_content,
                 "entity_data": entity_data,  # Store complete entity extraction results
                 "processing_metadata": {
                     "total_words": sum(chunk['word_count'] for chunk in chunks),
@@ -148,21 +138,89 @@ class EnterpriseRAGPipeline:
                 }
             }
             
-            doc_id = DocumentModel.create_document(doc_metadata)
+            if file_name.lower().endswith(STRUCTURED_EXTENSIONS):
+                doc_metadata["full_text"] = text_content
+            # Other documents are not duplicated here; get_full_text rebuilds them from their chunks
+            
+            doc_id = await asyncio.to_thread(DocumentModel.create_document, doc_metadata)
+            
+            # Entity information shared by every chunk (Pinecone-compatible format)
+            entity_counts = Counter(e.get('chunk_index') for e in entity_data['entities'])
+            enterprise_entities = entity_data['enterprise_entities']
+            upload_date = datetime.utcnow().isoformat()
+            
+            semaphore = asyncio.Semaphore(MAX_INFLIGHT_BATCHES)
+            
+            async def upsert_batch(vectors: List[Dict[str, Any]]):
+                # Recorded before the call: a failed upsert may still have written part of the batch
+                vector_ids.extend(vector["id"] for vector in vectors)
+                async with semaphore:
+                    await asyncio.to_thread(pinecone_client.upsert_vectors, vectors, tenant_id)
+            
+            async def embed_batch(start: int, tg: asyncio.TaskGroup):
+                batch_chunks = chunks[start:start + EMBEDDING_BATCH_SIZE]
+                async with semaphore:
+                    embeddings = await embedding_service.aembed_documents([chunk['text'] for chunk in batch_chunks])
+                
+                # Prepare vectors for Pinecone with enhanced metadata
+                vectors = []
+                for i, (chunk, embedding) in enumerate(zip(batch_chunks, embeddings), start):
+                    # doc_id makes the ID unique and lets get_full_text list a document's chunks by prefix
+                    vector_id = f"{tenant_id}_{doc_id}_{i}"
+                    vectors.append({
+                        "id": vector_id,
+                        "values": embedding,
+                        "metadata": {
+                            "tenant_id": tenant_id,
+                            "file_name": file_name,
+                            "file_path": file_path,
+                            "chunk_index": i,
+                            "text": chunk['text'],
+                            "chunk_type": chunk['type'],
+                            "section_title": chunk.get('section_title', ''),
+                            "page_number": chunk.get('page_number', 0),
+                            "word_count": chunk['word_count'],
+                            "uploaded_by": user_id,
+                            "upload_date": upload_date,
+                            "document_type": document_type,
+                            "doc_id": doc_id,
+                            "entity_count": entity_counts[i],
+                            "enterprise_entity_types": list(enterprise_entities.keys()),
+                            "has_financial_terms": "financial_terms" in enterprise_entities,
+                            "has_technical_terms": "technical_terms" in enterprise_entities,
+                            "has_legal_terms": "legal_terms" in enterprise_entities
+                        }
+                    })
+                
+                # Start upserting this batch right away; later embedding batches keep running
+                for offset in range(0, len(vectors), UPSERT_BATCH_SIZE):
+                    tg.create_task(upsert_batch(vectors[offset:offset + UPSERT_BATCH_SIZE]))
             
-            # Update vectors with doc_id
-            for vector in vectors:
-                vector["metadata"]["doc_id"] = doc_id
+            async with asyncio.TaskGroup() as tg:
+                for start in range(0, len(chunks), EMBEDDING_BATCH_SIZE):
+                    tg.create_task(embed_batch(start, tg))
             
-            # Store vectors in Pinecone
-            pinecone_client.upsert_vectors(vectors, namespace=tenant_id)
             logger.info(f"Enterprise document processed successfully: {doc_id}")
             
             return doc_id
             
         except Exception as e:
-            logger.error(f"Enterprise document processing failed: {e}")
-            raise
+            # Report the first failed batch rather than the TaskGroup wrapper
+            error = e.exceptions[0] if isinstance(e, ExceptionGroup) else e
+            logger.error(f"Enterprise document processing failed: {error}")
+            if doc_id:
+                # Don't leave a document record or orphaned vectors behind for a failed ingest
+                await asyncio.to_thread(self._discard_failed_document, doc_id, tenant_id, vector_ids)
+            raise error
+    
+    def _discard_failed_document(self, doc_id: str, tenant_id: str, vector_ids: List[str]):
+        """Remove whatever a failed ingest already wrote to Pinecone and MongoDB"""
+        try:
+            for offset in range(0, len(vector_ids), DELETE_BATCH_SIZE):
+                pinecone_client.delete_vectors(vector_ids[offset:offset + DELETE_BATCH_SIZE], tenant_id)
+        except Exception as e:
+            logger.error(f"Failed to remove vectors of failed document {doc_id}: {e}")
+        DocumentModel.delete_document(doc_id, tenant_id)
     
     def query_documents(self, query: str, tenant_id: str, user_id: str, 
                        top_k: int = 8) -> Dict[str, Any]:  # More results for better context
@@ -289,7 +347,7 @@ class EnterpriseRAGPipeline:
         chunks = []
         
         # Special handling for Excel/CSV files
-        if file_name.lower().endswith(('.xlsx', '.xls', '.csv')):
+        if file_name.lower().endswith(STRUCTURED_EXTENSIONS):
             return self._chunk_structured_data(text, file_name)
         
         # Detect document structure
@@ -1197,7 +1255,12 @@ Provide a comprehensive, professional response that would be appropriate for ent
                         }],
                         "charts": [chart],
                         "images": [],
-                        "structured_data": [{"type": "example", "data": example_data, "chart_type": chart_type}],
+                        "structured_data": [{
+                            "type": "example",
+                            "labels": [item["label"] for item in example_data],
+                            "values": [item["value"] for item in example_data],
+                            "chart_type": chart_type
+                        }],
                         "summary_visualization": chart
                     }
             
@@ -1275,6 +1338,23 @@ Provide a comprehensive, professional response that would be appropriate for ent
             logger.error(f"Error creating example chart: {e}")
             return None
     
+    def get_full_text(self, doc_id: str, tenant_id: str, document: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Full text of a document: the stored copy, else rebuilt from its chunks in Pinecone"""
+        try:
+            if document is None:
+                document = DocumentModel.get_document_by_id(doc_id, tenant_id)
+                if not document:
+                    return None
+            if document.get("full_text"):
+                return document["full_text"]
+            
+            # Records ingested without full_text are rebuilt from their chunks
+            return rebuild_document_text(tenant_id, doc_id, self.config.chunking.chunk_overlap)
+            
+        except Exception as e:
+            logger.error(f"Full text retrieval failed for {doc_id}: {e}")
+            return None
+    
     def delete_document(self, doc_id: str, tenant_id: str) -> bool:
         """Delete document and its embeddings"""
         try:
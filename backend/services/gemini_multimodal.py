@@ -1,165 +1,746 @@
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+import PIL.Image
+import asyncio
 import os
 import logging
 import base64
-import tempfile
-from typing import Optional, Dict, Any
+import io
+import hashlib
+import functools
+import json
+import threading
+import time
+import random
+import shutil
+import subprocess
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Tuple
 from pathlib import Path
 
+MEDIA_MIME_TYPES = {
+    '.mp4': 'video/mp4', '.avi': 'video/x-msvideo', '.mov': 'video/quicktime',
+    '.mkv': 'video/x-matroska', '.webm': 'video/webm', '.flv': 'video/x-flv',
+    '.mp3': 'audio/mpeg', '.wav': 'audio/wav', '.m4a': 'audio/mp4',
+    '.flac': 'audio/flac', '.aac': 'audio/aac', '.ogg': 'audio/ogg',
+}
+
 logger = logging.getLogger(__name__)
 
+# File-state polling: start short so small clips return quickly, then back off
+POLL_INITIAL_DELAY = 0.25
+POLL_MAX_DELAY = 5.0
+
+# Gemini keeps uploaded files for 48h; reuse results for re-ingested media over the same window
+RESULT_CACHE_TTL_SECONDS = 48 * 3600
+
+# Images are downscaled and re-encoded before upload; plenty of resolution for OCR + description
+IMAGE_MAX_DIMENSION = 2048
+IMAGE_JPEG_QUALITY = 85
+
+# Several small images share one generate_content call, kept under the ~20MB inline request limit
+IMAGE_BATCH_SIZE = int(os.getenv("GEMINI_IMAGE_BATCH_SIZE", "6"))
+INLINE_PAYLOAD_LIMIT = 18 * 1024 * 1024
+
+# Videos are probed before upload: over-long or oversized files are rejected, high-resolution
+# ones are downscaled when ffmpeg is available (Gemini samples frames at low resolution anyway)
+MAX_VIDEO_BYTES = int(os.getenv("GEMINI_MAX_VIDEO_MB", "2048")) * 1024 * 1024
+MAX_VIDEO_SECONDS = int(os.getenv("GEMINI_MAX_VIDEO_SECONDS", "3600"))
+VIDEO_MAX_WIDTH = int(os.getenv("GEMINI_VIDEO_MAX_WIDTH", "1280"))
+VIDEO_TRANSCODE_ARGS = ['-vf', 'scale=-2:480', '-c:v', 'libx264', '-preset', 'veryfast', '-b:v', '800k',
+                        '-c:a', 'aac', '-b:a', '64k', '-movflags', 'frag_keyframe+empty_moov', '-f', 'mp4']
+FFPROBE = shutil.which("ffprobe")
+FFMPEG = shutil.which("ffmpeg")
+
+# Workers per stage in the batch upload -> poll -> generate pipeline
+PIPELINE_WORKERS = int(os.getenv("GEMINI_PIPELINE_WORKERS", "4"))
+
+VIDEO_PROMPT = """Please analyze this video file and provide:
+
+1. Content Summary - key information, general information that can be useful for document retrieval.
+
+2. Transcription
+"""
+
+AUDIO_PROMPT = """Please analyze this audio file and provide:
+
+1. Transcription
+
+2. Content Summary - key happenings, general context, surroundings, and any information that can be useful for document retrieval.
+
+Key Information
+
+Context
+"""
+
+IMAGE_PROMPT = """Please analyze this image and provide:
+
+1. *perform ocr
+
+2. provide Visual Description* - general context and key information. anything that can be useful for document retrieval.
+"""
+
+IMAGE_BATCH_PROMPT = """You are given {count} images, labelled Image 0 to Image {last}. For each image:
+
+1. perform ocr
+
+2. provide Visual Description - general context and key information. anything that can be useful for document retrieval.
+
+Return one entry per image, in image order.
+"""
+
+# Structured output for batched images: the model emits exactly this shape, no prose or code fences
+IMAGE_BATCH_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {
+                "index": {"type": "integer"},
+                "ocr": {"type": "string"},
+                "description": {"type": "string"},
+            },
+            "required": ["index", "ocr", "description"],
+        },
+    },
+}
+
+@dataclass
+class _MediaJob:
+    """A single file moving through the batch pipeline"""
+    index: int
+    content: bytes
+    filename: str
+    kind: str
+    label: str
+    prompt: str
+    slots: asyncio.Semaphore
+    cache_key: str
+    future: Future
+    uploaded: Any = None
+    holds_slot: bool = False
+
+def _poll_delays():
+    """Backoff schedule for file-state polling: doubling up to the cap, with up to 10% jitter"""
+    delay = POLL_INITIAL_DELAY
+    while True:
+        yield delay + random.uniform(0, delay * 0.1)
+        delay = min(delay * 2, POLL_MAX_DELAY)
+
 class GeminiMultimodalService:
     def __init__(self):
         self.api_key = os.getenv("GOOGLE_API_KEY")
         if not self.api_key:
             raise ValueError("GOOGLE_API_KEY environment variable is required")
         
-        genai.configure(api_key=self.api_key)
-        # Use gemini-2.5-flash for multimodal processing (supports video, audio, images)
+        # gRPC keeps one long-lived HTTP/2 channel per client (sync and asyncio), so repeated
+        # upload/poll/generate calls reuse connections instead of re-handshaking TLS
+        genai.configure(api_key=self.api_key, transport="grpc")
+        # Use gemini-2.5-flash for multimodal processing (supports video, audio, images).
+        # One model handle is shared by every thread and task: generate_content is stateless
+        # and reuses the client's pooled channel, so never build per-call models.
         self.model = genai.GenerativeModel('gemini-2.5-flash')
         
         # Supported file types for multimodal processing
         self.supported_video_formats = {'.mp4', '.avi', '.mov', '.mkv', '.webm', '.flv'}
         self.supported_audio_formats = {'.mp3', '.wav', '.m4a', '.flac', '.aac', '.ogg'}
         self.supported_image_formats = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp'}
+        
+        # Single hash probe per filename instead of an endswith() loop per modality
+        self._ext_kind = {
+            **{ext: 'video' for ext in self.supported_video_formats},
+            **{ext: 'audio' for ext in self.supported_audio_formats},
+            **{ext: 'image' for ext in self.supported_image_formats},
+        }
+        
+        # Cap simultaneous Gemini requests per media type so bulk ingestion
+        # overlaps work without tripping 429/ResourceExhausted
+        self._slot_limits = {
+            'video': int(os.getenv("GEMINI_VIDEO_CONCURRENCY", "6")),
+            'audio': int(os.getenv("GEMINI_AUDIO_CONCURRENCY", "12")),
+            'image': int(os.getenv("GEMINI_IMAGE_CONCURRENCY", "24")),
+        }
+        # Threading slots serve the sync entry points, which block their own thread
+        self._video_slots = threading.BoundedSemaphore(self._slot_limits['video'])
+        self._audio_slots = threading.BoundedSemaphore(self._slot_limits['audio'])
+        self._image_slots = threading.BoundedSemaphore(self._slot_limits['image'])
+        # The async batch paths wait on asyncio semaphores instead, so no pool thread ever
+        # parks in an acquire; asyncio primitives bind to one loop, hence one set per loop
+        self._loop_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+        self._loop_slots_lock = threading.Lock()
+        
+        # LRU of content hash -> (stored_at, result text) so re-indexing skips upload+generate
+        self._result_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._result_cache_lock = threading.Lock()
+        self.result_cache_size = int(os.getenv("GEMINI_RESULT_CACHE_SIZE", "1024"))
+        
+        # Singleflight: content hash -> Future of the request already working on it, so
+        # duplicates submitted concurrently share one Gemini call (guarded by the cache lock)
+        self._inflight: Dict[str, Future] = {}
+        
+        # Bounded pool for the blocking SDK calls made from the async batch paths, so a
+        # large batch cannot flood the process with parked threads
+        self._pool = ThreadPoolExecutor(max_workers=int(os.getenv("GEMINI_THREADS", "16")),
+                                        thread_name_prefix="gemini")
+    
+    async def _run(self, fn, *args, **kwargs):
+        """Run a blocking call on the service's bounded thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+    
+    def _async_slots(self, kind: str) -> asyncio.Semaphore:
+        """The running event loop's semaphore capping concurrent requests for a modality"""
+        loop = asyncio.get_running_loop()
+        with self._loop_slots_lock:
+            slots = self._loop_slots.get(loop)
+            if slots is None:
+                slots = {name: asyncio.Semaphore(limit) for name, limit in self._slot_limits.items()}
+                self._loop_slots[loop] = slots
+        return slots[kind]
+    
+    def close(self):
+        """Shut down the blocking-call thread pool"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+    
+    def classify(self, filename: str) -> Optional[str]:
+        """Return 'video', 'audio' or 'image' for supported files, otherwise None"""
+        return self._ext_kind.get(os.path.splitext(filename)[1].lower())
     
     def is_video_file(self, filename: str) -> bool:
         """Check if file is a supported video format"""
-        return any(filename.lower().endswith(ext) for ext in self.supported_video_formats)
+        return self.classify(filename) == 'video'
     
     def is_audio_file(self, filename: str) -> bool:
         """Check if file is a supported audio format"""  
-        return any(filename.lower().endswith(ext) for ext in self.supported_audio_formats)
+        return self.classify(filename) == 'audio'
     
     def is_supported_image(self, filename: str) -> bool:
         """Check if file is a supported image format for Gemini"""
-        return any(filename.lower().endswith(ext) for ext in self.supported_image_formats)
+        return self.classify(filename) == 'image'
+    
+    def _content_key(self, kind: str, file_content: bytes) -> str:
+        """Cache key for a piece of media: modality plus a fast content digest.
+        
+        blake2b releases the GIL on large buffers, so async callers hash in a worker thread.
+        """
+        return f"{kind}:{hashlib.blake2b(file_content, digest_size=16).hexdigest()}"
+    
+    def _lookup_cached_result(self, key: str) -> Optional[str]:
+        """Fresh cached result for key, if any; caller must hold the cache lock"""
+        entry = self._result_cache.get(key)
+        if entry is None:
+            return None
+        
+        stored_at, result = entry
+        if time.monotonic() - stored_at > RESULT_CACHE_TTL_SECONDS:
+            del self._result_cache[key]
+            return None
+        
+        self._result_cache.move_to_end(key)
+        return result
+    
+    def _store_result(self, key: str, result: str):
+        with self._result_cache_lock:
+            self._result_cache[key] = (time.monotonic(), result)
+            self._result_cache.move_to_end(key)
+            while len(self._result_cache) > self.result_cache_size:
+                self._result_cache.popitem(last=False)
+    
+    def _claim(self, key: str) -> Tuple[Future, bool]:
+        """Return the Future carrying key's result and whether the caller must produce it.
+        
+        Cache hits come back as an already-resolved Future; duplicates of an in-flight
+        request get that request's Future. Owners must call _settle exactly once.
+        """
+        with self._result_cache_lock:
+            cached = self._lookup_cached_result(key)
+            if cached is not None:
+                future = Future()
+                future.set_result(cached)
+                return future, False
+            
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+    
+    def _settle(self, key: str, future: Future, result: Optional[str]):
+        """Publish an owned request's result to the cache and to anyone waiting on it"""
+        if result:
+            self._store_result(key, result)
+        with self._result_cache_lock:
+            self._inflight.pop(key, None)
+        future.set_result(result)
+    
+    def _process_with_cache(self, kind: str, file_content: bytes, filename: str,
+                            slots: threading.BoundedSemaphore, process) -> Optional[str]:
+        """Serve repeat media from the result cache or an identical in-flight request,
+        otherwise process it under the modality's slot limit"""
+        key = self._content_key(kind, file_content)
+        future, owner = self._claim(key)
+        if not owner:
+            logger.info(f"Reusing Gemini {kind} result for identical content: {filename}")
+            return future.result()
+        
+        result = None
+        try:
+            with slots:
+                result = process(file_content, filename)
+        finally:
+            self._settle(key, future, result)
+        return result
+    
+    def _upload_media(self, file_content: bytes, filename: str, mime_type: Optional[str] = None):
+        """Upload in-memory media to the Gemini Files API without a temp-file round-trip"""
+        if mime_type is None:
+            suffix = Path(filename).suffix.lower()
+            mime_type = MEDIA_MIME_TYPES.get(suffix, 'application/octet-stream')
+        return genai.upload_file(io.BytesIO(file_content), mime_type=mime_type, display_name=filename)
+    
+    def _probe_video(self, file_content: bytes) -> Tuple[Optional[float], Optional[int]]:
+        """Return (duration seconds, width) via ffprobe, or (None, None) if it is unavailable"""
+        if not FFPROBE:
+            return None, None
+        try:
+            probe = subprocess.run(
+                [FFPROBE, '-v', 'error', '-select_streams', 'v:0', '-show_entries',
+                 'stream=width:format=duration', '-of', 'json', '-i', 'pipe:0'],
+                input=file_content, capture_output=True, timeout=60, check=True)
+            info = json.loads(probe.stdout)
+        except (OSError, subprocess.SubprocessError, ValueError) as e:
+            logger.warning(f"Could not probe video: {e}")
+            return None, None
+        duration = info.get('format', {}).get('duration')
+        streams = info.get('streams') or [{}]
+        width = streams[0].get('width')
+        return (float(duration) if duration else None), width
+    
+    def _fit_video(self, file_content: bytes, filename: str) -> Tuple[bytes, Optional[str]]:
+        """Reject videos Gemini can't take and downscale large ones before upload.
+        
+        Returns the bytes to upload and their mime type (None to infer from the filename).
+        """
+        if len(file_content) > MAX_VIDEO_BYTES:
+            raise ValueError(f"video is {len(file_content) // (1024 * 1024)}MB, limit is {MAX_VIDEO_BYTES // (1024 * 1024)}MB")
+        
+        duration, width = self._probe_video(file_content)
+        if duration is not None and duration > MAX_VIDEO_SECONDS:
+            raise ValueError(f"video is {duration:.0f}s long, limit is {MAX_VIDEO_SECONDS}s")
+        if not width or width <= VIDEO_MAX_WIDTH or not FFMPEG:
+            return file_content, None
+        
+        try:
+            transcode = subprocess.run([FFMPEG, '-v', 'error', '-i', 'pipe:0', *VIDEO_TRANSCODE_ARGS, 'pipe:1'],
+                                       input=file_content, capture_output=True, timeout=600, check=True)
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning(f"Downscaling {filename} failed, uploading original: {e}")
+            return file_content, None
+        if not transcode.stdout or len(transcode.stdout) >= len(file_content):
+            return file_content, None
+        logger.info(f"Downscaled {filename} to 480p: {len(file_content)} -> {len(transcode.stdout)} bytes")
+        return transcode.stdout, 'video/mp4'
+    
+    def _delete_remote_file(self, uploaded_file):
+        """Best-effort delete of an uploaded file; a failed cleanup must not discard a good result"""
+        try:
+            genai.delete_file(uploaded_file.name)
+        except google_exceptions.GoogleAPIError as e:
+            logger.warning(f"Failed to delete Gemini file {uploaded_file.name}: {e}")
+    
+    def _wait_until_active(self, uploaded_file, label: str):
+        """Poll an uploaded file with exponential backoff + jitter until Gemini is done with it"""
+        delays = _poll_delays()
+        while uploaded_file.state.name == "PROCESSING":
+            logger.info(f"{label} file processing...")
+            time.sleep(next(delays))
+            uploaded_file = genai.get_file(uploaded_file.name)
+        
+        if uploaded_file.state.name == "FAILED":
+            raise Exception(f"{label} file processing failed")
+        
+        return uploaded_file
+    
+    async def _wait_until_active_async(self, uploaded_file, label: str):
+        """Async variant of _wait_until_active that sleeps on the event loop instead of a thread"""
+        delays = _poll_delays()
+        while uploaded_file.state.name == "PROCESSING":
+            await asyncio.sleep(next(delays))
+            uploaded_file = await self._run(genai.get_file, uploaded_file.name)
+        
+        if uploaded_file.state.name == "FAILED":
+            raise Exception(f"{label} file processing failed")
+        
+        return uploaded_file
+    
+    async def process_media_batch(self, items: List[Tuple[bytes, str]]) -> List[Optional[str]]:
+        """Process many video/audio files as an upload -> poll -> generate pipeline.
+        
+        Stages are connected by bounded queues so uploads of later files overlap
+        polling and generation of earlier ones. Results come back in input order;
+        unsupported or failed files yield None.
+        """
+        results: List[Optional[str]] = [None] * len(items)
+        upload_queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_WORKERS * 2)
+        poll_queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_WORKERS * 2)
+        infer_queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_WORKERS * 2)
+        
+        def release_slot(job: _MediaJob):
+            if job.holds_slot:
+                job.holds_slot = False
+                job.slots.release()
+        
+        async def fail(job: _MediaJob, e: Exception):
+            logger.error(f"{job.label} processing failed for {job.filename}: {e}")
+            release_slot(job)
+            self._settle(job.cache_key, job.future, None)
+            if job.uploaded is not None:
+                await self._run(self._delete_remote_file, job.uploaded)
+        
+        async def upload_worker():
+            while True:
+                job = await upload_queue.get()
+                try:
+                    # Hold the modality slot from upload until generation finishes
+                    await job.slots.acquire()
+                    job.holds_slot = True
+                    try:
+                        logger.info(f"Processing {job.kind} file: {job.filename}")
+                        content, mime_type = job.content, None
+                        if job.kind == "video":
+                            content, mime_type = await self._run(self._fit_video, content, job.filename)
+                        job.uploaded = await self._run(self._upload_media, content, job.filename, mime_type)
+                    except Exception as e:
+                        await fail(job, e)
+                        continue
+                    await poll_queue.put(job)
+                finally:
+                    upload_queue.task_done()
+        
+        async def poll_worker():
+            while True:
+                job = await poll_queue.get()
+                try:
+                    try:
+                        job.uploaded = await self._wait_until_active_async(job.uploaded, job.label)
+                    except Exception as e:
+                        await fail(job, e)
+                        continue
+                    await infer_queue.put(job)
+                finally:
+                    poll_queue.task_done()
+        
+        async def infer(job: _MediaJob) -> Optional[str]:
+            try:
+                # Async gRPC call multiplexed on the event loop's channel, no worker thread held
+                response = await self.model.generate_content_async([job.uploaded, job.prompt])
+                result = response.text.strip() if response.text else None
+            except Exception as e:
+                await fail(job, e)
+                return None
+            
+            release_slot(job)
+            await self._run(self._delete_remote_file, job.uploaded)
+            return result
+        
+        async def infer_worker():
+            while True:
+                job = await infer_queue.get()
+                try:
+                    result = await infer(job)
+                    if not job.future.done():
+                        self._settle(job.cache_key, job.future, result)
+                    results[job.index] = result
+                finally:
+                    infer_queue.task_done()
+        
+        owned: List[_MediaJob] = []
+        shared: List[Tuple[int, Future]] = []
+        workers = [asyncio.create_task(worker())
+                   for worker in (upload_worker, poll_worker, infer_worker)
+                   for _ in range(PIPELINE_WORKERS)]
+        try:
+            for index, (file_content, filename) in enumerate(items):
+                kind = self.classify(filename)
+                if kind == "video":
+                    label, prompt = "Video", VIDEO_PROMPT
+                elif kind == "audio":
+                    label, prompt = "Audio", AUDIO_PROMPT
+                else:
+                    logger.warning(f"Skipping non-media file in batch: {filename}")
+                    continue
+                
+                # Hashing a few hundred MB of video takes long enough to stall the loop
+                cache_key = await self._run(self._content_key, kind, file_content)
+                future, owner = self._claim(cache_key)
+                if not owner:
+                    # Cached, duplicated earlier in this batch, or already in flight elsewhere
+                    shared.append((index, future))
+                    continue
+                
+                job = _MediaJob(index, file_content, filename, kind, label, prompt,
+                                self._async_slots(kind), cache_key, future)
+                owned.append(job)
+                await upload_queue.put(job)
+            
+            # Each stage hands off before marking done, so joining in order drains the pipeline
+            await upload_queue.join()
+            await poll_queue.join()
+            await infer_queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            # Never leave other waiters hanging on a job this batch abandoned, and hand
+            # back slots held by jobs a cancellation cut short
+            for job in owned:
+                release_slot(job)
+                if not job.future.done():
+                    self._settle(job.cache_key, job.future, None)
+        
+        for index, future in shared:
+            results[index] = await asyncio.wrap_future(future)
+        
+        return results
+    
+    async def process_any(self, items: List[Tuple[bytes, str]]) -> List[Optional[str]]:
+        """Process a mixed batch of video, audio and image files concurrently.
+        
+        Images go through the batched image path alongside the video/audio pipeline so
+        a long video does not hold up quick images. Results come back in input order;
+        unsupported files yield None.
+        """
+        results: List[Optional[str]] = [None] * len(items)
+        kinds = [self.classify(filename) for _, filename in items]
+        media_indices = [index for index, kind in enumerate(kinds) if kind in ('video', 'audio')]
+        image_indices = [index for index, kind in enumerate(kinds) if kind == 'image']
+        for index, kind in enumerate(kinds):
+            if kind is None:
+                logger.warning(f"Unsupported file type for Gemini processing: {items[index][1]}")
+        
+        async def run_batch(indices: List[int], process_batch):
+            batch_results = await process_batch([items[index] for index in indices])
+            for index, result in zip(indices, batch_results):
+                results[index] = result
+        
+        async with asyncio.TaskGroup() as tg:
+            if media_indices:
+                tg.create_task(run_batch(media_indices, self.process_media_batch))
+            if image_indices:
+                tg.create_task(run_batch(image_indices, self.process_image_batch))
+        
+        return results
     
     def process_video_file(self, file_content: bytes, filename: str) -> Optional[str]:
         """Process video file with Gemini and return transcription/summary"""
+        return self._process_with_cache("video", file_content, filename,
+                                        self._video_slots, self._process_video_file)
+    
+    def _process_video_file(self, file_content: bytes, filename: str) -> Optional[str]:
         try:
             logger.info(f"Processing video file: {filename}")
             
-            # Create temporary file for Gemini API
-            with tempfile.NamedTemporaryFile(delete=False, suffix=Path(filename).suffix) as temp_file:
-                temp_file.write(file_content)
-                temp_file_path = temp_file.name
+            # Reject or downscale before paying for the upload
+            upload_content, mime_type = self._fit_video(file_content, filename)
+            
+            # Upload video bytes to Gemini straight from memory
+            video_file = self._upload_media(upload_content, filename, mime_type)
             
             try:
-                # Upload video file to Gemini
-                video_file = genai.upload_file(temp_file_path)
-                
                 # Wait for file to be processed
-                import time
-                while video_file.state.name == "PROCESSING":
-                    logger.info("Video file processing...")
-                    time.sleep(5)
-                    video_file = genai.get_file(video_file.name)
-                
-                if video_file.state.name == "FAILED":
-                    raise Exception("Video file processing failed")
+                video_file = self._wait_until_active(video_file, "Video")
                 
                 # Generate comprehensive summary and transcription
-                prompt = """Please analyze this video file and provide:
-
-1. Content Summary - key information, general information that can be useful for document retrieval.
-
-2. Transcription
-"""
-
-                response = self.model.generate_content([video_file, prompt])
-                
-                # Clean up uploaded file
-                genai.delete_file(video_file.name)
-                
-                return response.text.strip() if response.text else None
-                
+                response = self.model.generate_content([video_file, VIDEO_PROMPT])
             finally:
-                # Clean up temporary file
-                try:
-                    os.unlink(temp_file_path)
-                except:
-                    pass
-                    
+                # Clean up uploaded file
+                self._delete_remote_file(video_file)
+            
+            return response.text.strip() if response.text else None
+
         except Exception as e:
             logger.error(f"Video processing failed for {filename}: {e}")
             return None
     
     def process_audio_file(self, file_content: bytes, filename: str) -> Optional[str]:
         """Process audio file with Gemini and return transcription/summary"""
+        return self._process_with_cache("audio", file_content, filename,
+                                        self._audio_slots, self._process_audio_file)
+    
+    def _process_audio_file(self, file_content: bytes, filename: str) -> Optional[str]:
         try:
             logger.info(f"Processing audio file: {filename}")
             
-            # Create temporary file for Gemini API
-            with tempfile.NamedTemporaryFile(delete=False, suffix=Path(filename).suffix) as temp_file:
-                temp_file.write(file_content)
-                temp_file_path = temp_file.name
+            # Upload audio bytes to Gemini straight from memory
+            audio_file = self._upload_media(file_content, filename)
             
             try:
-                # Upload audio file to Gemini
-                audio_file = genai.upload_file(temp_file_path)
-                
                 # Wait for file to be processed
-                import time
-                while audio_file.state.name == "PROCESSING":
-                    logger.info("Audio file processing...")
-                    time.sleep(3)
-                    audio_file = genai.get_file(audio_file.name)
-                
-                if audio_file.state.name == "FAILED":
-                    raise Exception("Audio file processing failed")
+                audio_file = self._wait_until_active(audio_file, "Audio")
                 
                 # Generate transcription and summary
-                prompt = """Please analyze this audio file and provide:
-
-1. Transcription
-
-2. Content Summary - key happenings, general context, surroundings, and any information that can be useful for document retrieval.
-
-Key Information
-
-Context
-"""
-
-                response = self.model.generate_content([audio_file, prompt])
-                
-                # Clean up uploaded file
-                genai.delete_file(audio_file.name)
-                
-                return response.text.strip() if response.text else None
-                
+                response = self.model.generate_content([audio_file, AUDIO_PROMPT])
             finally:
-                # Clean up temporary file
-                try:
-                    os.unlink(temp_file_path)
-                except:
-                    pass
-                    
+                # Clean up uploaded file
+                self._delete_remote_file(audio_file)
+            
+            return response.text.strip() if response.text else None
+
         except Exception as e:
             logger.error(f"Audio processing failed for {filename}: {e}")
             return None
     
+    def _prepare_image_part(self, file_content: bytes) -> Dict[str, Any]:
+        """Decode, downscale and re-encode an image into an inline JPEG blob for Gemini"""
+        # Open image
+        image = PIL.Image.open(io.BytesIO(file_content))
+        
+        # Let libjpeg decode straight to RGB at 1/2, 1/4 or 1/8 scale instead of full resolution
+        if image.format in ('JPEG', 'MPO'):
+            image.draft('RGB', (IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+        
+        # Shrink large photos and flatten onto white so transparent PNGs keep legible text
+        image.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION), PIL.Image.LANCZOS)
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            image = image.convert('RGBA')
+            background = PIL.Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        
+        # Send compact JPEG bytes rather than letting the SDK re-encode as lossless WebP
+        jpeg_buffer = io.BytesIO()
+        image.save(jpeg_buffer, format='JPEG', quality=IMAGE_JPEG_QUALITY)
+        return {'mime_type': 'image/jpeg', 'data': jpeg_buffer.getvalue()}
+    
+    async def process_image_batch(self, items: List[Tuple[bytes, str]]) -> List[Optional[str]]:
+        """Describe several images per Gemini request.
+        
+        Images are packed up to GEMINI_IMAGE_BATCH_SIZE per call (and under the inline
+        payload limit) and the model answers with one JSON entry per image. A batch whose
+        response cannot be parsed falls back to one request per image. Results come back
+        in input order.
+        """
+        results: List[Optional[str]] = [None] * len(items)
+        
+        # Jobs are (index, file_content, filename, cache_key, future) for content this call owns
+        pending, shared = [], []
+        for index, (file_content, filename) in enumerate(items):
+            cache_key = await self._run(self._content_key, "image", file_content)
+            future, owner = self._claim(cache_key)
+            if owner:
+                pending.append((index, file_content, filename, cache_key, future))
+            else:
+                shared.append((index, future))
+        
+        try:
+            parts = await asyncio.gather(*(self._run(self._prepare_image_part, job[1]) for job in pending),
+                                         return_exceptions=True)
+            
+            batches, current, current_size, oversized = [], [], 0, []
+            for job, part in zip(pending, parts):
+                if isinstance(part, Exception):
+                    logger.error(f"Image processing with Gemini failed for {job[2]}: {part}")
+                    continue
+                size = len(part['data'])
+                if size > INLINE_PAYLOAD_LIMIT:
+                    # Too big to inline; the single-image path goes through the Files API
+                    oversized.append(job)
+                    continue
+                if current and (len(current) >= IMAGE_BATCH_SIZE or current_size + size > INLINE_PAYLOAD_LIMIT):
+                    batches.append(current)
+                    current, current_size = [], 0
+                current.append((job, part))
+                current_size += size
+            if current:
+                batches.append(current)
+            
+            await asyncio.gather(*(self._run_image_batch(batch, results) for batch in batches),
+                                 *(self._run_single_image(job, results) for job in oversized))
+        finally:
+            for job in pending:
+                if not job[4].done():
+                    self._settle(job[3], job[4], results[job[0]])
+        
+        for index, future in shared:
+            results[index] = await asyncio.wrap_future(future)
+        
+        return results
+    
+    async def _run_single_image(self, job: tuple, results: List[Optional[str]]):
+        """One-image request for a job this batch already owns (bypasses singleflight claiming)"""
+        async with self._async_slots('image'):
+            result = await self._run(self._process_image_file, job[1], job[2])
+        self._settle(job[3], job[4], result)
+        results[job[0]] = result
+    
+    async def _generate_image_batch(self, contents: List[Any]):
+        async with self._async_slots('image'):
+            return await self.model.generate_content_async(contents, generation_config=IMAGE_BATCH_GENERATION_CONFIG)
+    
+    async def _run_image_batch(self, batch: List[Tuple[tuple, Dict[str, Any]]], results: List[Optional[str]]):
+        """Send one packed image request and spread the per-image answers into results"""
+        contents: List[Any] = []
+        for position, (_, part) in enumerate(batch):
+            contents.extend([f"Image {position}:", part])
+        contents.append(IMAGE_BATCH_PROMPT.format(count=len(batch), last=len(batch) - 1))
+        
+        try:
+            response = await self._generate_image_batch(contents)
+            entries = json.loads(response.text)
+            if not isinstance(entries, list) or len(entries) != len(batch) or \
+                    not all(isinstance(entry, dict) for entry in entries):
+                raise ValueError(f"expected {len(batch)} entries, got {len(entries) if isinstance(entries, list) else type(entries).__name__}")
+            # Answers are matched to images by index; anything but exactly 0..N-1 would misattribute them
+            indices = [entry.get("index") for entry in entries]
+            if not all(type(index) is int for index in indices) or sorted(indices) != list(range(len(batch))):
+                raise ValueError(f"expected indices 0..{len(batch) - 1}, got {indices}")
+        except Exception as e:
+            logger.warning(f"Batched image analysis failed, falling back to per-image requests: {e}")
+            await asyncio.gather(*(self._run_single_image(job, results) for job, _ in batch))
+            return
+        
+        by_position = {entry["index"]: entry for entry in entries}
+        for position, (job, _) in enumerate(batch):
+            entry = by_position[position]
+            sections = []
+            if entry.get("ocr"):
+                sections.append(f"OCR Text:\n{entry['ocr'].strip()}")
+            if entry.get("description"):
+                sections.append(f"Visual Description:\n{entry['description'].strip()}")
+            result = "\n\n".join(sections) or None
+            self._settle(job[3], job[4], result)
+            results[job[0]] = result
+    
     def process_image_file(self, file_content: bytes, filename: str) -> Optional[str]:
         """Process image file with Gemini and return OCR/description"""
+        return self._process_with_cache("image", file_content, filename,
+                                        self._image_slots, self._process_image_file)
+    
+    def _process_image_file(self, file_content: bytes, filename: str) -> Optional[str]:
         try:
             logger.info(f"Processing image file with Gemini: {filename}")
             
-            # Convert image to format suitable for Gemini
-            import PIL.Image
-            import io
-            
-            # Open image
-            image = PIL.Image.open(io.BytesIO(file_content))
+            image_part = self._prepare_image_part(file_content)
             
-            # Generate comprehensive OCR and description
-            prompt = """Please analyze this image and provide:
-
-1. *perform ocr
-
-2. provide Visual Description* - general context and key information. anything that can be useful for document retrieval.
-"""
-
-            response = self.model.generate_content([image, prompt])
+            # Generate comprehensive OCR and description. Inline bytes skip the Files API
+            # upload + poll round-trips; only encodes over the inline limit need an upload.
+            if len(image_part['data']) > INLINE_PAYLOAD_LIMIT:
+                image_file = self._upload_media(image_part['data'], filename, mime_type=image_part['mime_type'])
+                try:
+                    image_file = self._wait_until_active(image_file, "Image")
+                    response = self.model.generate_content([image_file, IMAGE_PROMPT])
+                finally:
+                    self._delete_remote_file(image_file)
+            else:
+                response = self.model.generate_content([image_part, IMAGE_PROMPT])
             
             return response.text.strip() if response.text else None
                 
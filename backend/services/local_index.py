@@ -0,0 +1,166 @@
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from db.pinecone_client import pinecone_client
+
+logger = logging.getLogger(__name__)
+
+FETCH_BATCH_SIZE = 100
+
+@dataclass
+class LocalMatch:
+    """Mirrors the fields of a Pinecone match that the pipeline reads"""
+    id: str
+    score: float
+    metadata: Dict[str, Any]
+
+@dataclass
+class LocalQueryResult:
+    matches: List[LocalMatch] = field(default_factory=list)
+
+class _TenantVectors:
+    """One tenant's vectors as a growable, row-normalized float32 matrix"""
+    
+    def __init__(self):
+        self.vectors: Optional[np.ndarray] = None  # allocated on first add, once the dimension is known
+        self.ids: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.rows: Dict[str, int] = {}
+        self.loaded_at = time.time()
+        self.too_large = False
+    
+    def add(self, vector_id: str, values: List[float], metadata: Dict[str, Any]):
+        vector = np.asarray(values, dtype=np.float32)
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        if self.vectors is None:
+            self.vectors = np.zeros((1024, vector.shape[0]), dtype=np.float32)
+        row = self.rows.get(vector_id)
+        if row is None:
+            row = len(self.ids)
+            if row == self.vectors.shape[0]:
+                self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+            self.ids.append(vector_id)
+            self.metadatas.append(metadata)
+            self.rows[vector_id] = row
+        else:
+            self.metadatas[row] = metadata
+        self.vectors[row] = vector
+    
+    def remove(self, vector_ids: List[str]):
+        removed = set(vector_ids)
+        keep = [row for row, vector_id in enumerate(self.ids) if vector_id not in removed]
+        if len(keep) == len(self.ids):
+            return
+        self.vectors[:len(keep)] = self.vectors[keep]
+        self.ids = [self.ids[row] for row in keep]
+        self.metadatas = [self.metadatas[row] for row in keep]
+        self.rows = {vector_id: row for row, vector_id in enumerate(self.ids)}
+
+class LocalVectorIndex:
+    """In-process exact cosine index per tenant, answering queries without a Pinecone round-trip.
+    
+    Opt-in (LOCAL_INDEX_ENABLED=true). A tenant is hydrated from Pinecone in the background on
+    its first query, which still goes to Pinecone; later queries are served locally. Vectors
+    ingested by this process are added as they are upserted, and each tenant is re-synced
+    from Pinecone after LOCAL_INDEX_TTL_SECONDS to pick up other workers' writes. Tenants
+    above LOCAL_INDEX_MAX_VECTORS always use Pinecone.
+    """
+    
+    def __init__(self):
+        self.enabled = os.getenv("LOCAL_INDEX_ENABLED", "false").lower() == "true"
+        self.max_vectors = int(os.getenv("LOCAL_INDEX_MAX_VECTORS", "50000"))
+        self.ttl_seconds = int(os.getenv("LOCAL_INDEX_TTL_SECONDS", "300"))
+        self._tenants: Dict[str, _TenantVectors] = {}
+        self._loading = set()
+        self._lock = threading.Lock()
+    
+    def search(self, tenant_id: str, query_vector: List[float], top_k: int) -> Optional[LocalQueryResult]:
+        """Top-k matches for a tenant, or None when the query should go to Pinecone"""
+        if not self.enabled:
+            return None
+        
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is None or time.time() - tenant.loaded_at > self.ttl_seconds:
+                self._schedule_load(tenant_id)
+            if tenant is None or tenant.too_large or not tenant.ids or query.shape[0] != tenant.vectors.shape[1]:
+                return None
+            
+            scores = tenant.vectors[:len(tenant.ids)] @ query
+            top_k = min(top_k, len(scores))
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+            best = best[np.argsort(-scores[best])]
+            return LocalQueryResult(matches=[
+                LocalMatch(id=tenant.ids[row], score=float(scores[row]), metadata=tenant.metadatas[row])
+                for row in best
+            ])
+    
+    def add(self, tenant_id: str, vectors: List[tuple]):
+        """Mirror freshly upserted (id, values, metadata) vectors into a loaded tenant"""
+        if not self.enabled:
+            return
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is None or tenant.too_large:
+                return
+            for vector_id, values, metadata in vectors:
+                tenant.add(vector_id, values, metadata)
+            if len(tenant.ids) > self.max_vectors:
+                tenant.too_large = True
+    
+    def remove(self, tenant_id: str, vector_ids: List[str]):
+        """Drop vectors deleted from Pinecone out of a loaded tenant"""
+        if not self.enabled:
+            return
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is not None:
+                tenant.remove(vector_ids)
+    
+    def _schedule_load(self, tenant_id: str):
+        # Caller holds the lock
+        if tenant_id in self._loading:
+            return
+        self._loading.add(tenant_id)
+        threading.Thread(target=self._load, args=(tenant_id,), daemon=True).start()
+    
+    def _load(self, tenant_id: str):
+        """Pull every vector of a tenant's namespace from Pinecone"""
+        try:
+            load_start = time.time()
+            tenant = _TenantVectors()
+            count = 0
+            for page in pinecone_client.list_vector_ids(namespace=tenant_id):
+                count += len(page)
+                if count > self.max_vectors:
+                    tenant.too_large = True
+                    break
+                for offset in range(0, len(page), FETCH_BATCH_SIZE):
+                    response = pinecone_client.fetch_vectors(page[offset:offset + FETCH_BATCH_SIZE], tenant_id)
+                    for vector_id, vector in response.vectors.items():
+                        tenant.add(vector_id, vector.values, dict(vector.metadata or {}))
+            
+            tenant.loaded_at = time.time()
+            with self._lock:
+                self._tenants[tenant_id] = tenant
+            if tenant.too_large:
+                logger.info(f"🗂️  Namespace {tenant_id} has over {self.max_vectors} vectors, staying on Pinecone")
+            else:
+                logger.info(f"🗂️  Loaded {len(tenant.ids)} vectors for {tenant_id} into the local index in {(time.time() - load_start) * 1000:.2f}ms")
+        except Exception as e:
+            logger.error(f"Local index load failed for {tenant_id}: {e}")
+        finally:
+            with self._lock:
+                self._loading.discard(tenant_id)
+
+# Global local vector index instance
+local_vector_index = LocalVectorIndex()
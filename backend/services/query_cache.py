@@ -0,0 +1,196 @@
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Paraphrases of a cached question land this close to it in embedding space
+SIMILARITY_THRESHOLD = 0.97
+REDIS_TTL_SECONDS = int(os.getenv("QUERY_CACHE_TTL_SECONDS", "300"))
+# Redis keys deleted per DEL call when a tenant's cache is invalidated
+REDIS_DELETE_BATCH_SIZE = 500
+
+class QueryCache:
+    """Two-tier query result cache.
+    
+    L1 is an in-process LRU that also answers semantically: a query whose embedding
+    is within SIMILARITY_THRESHOLD cosine of a cached one reuses its result. L2 is an
+    optional Redis store (set QUERY_CACHE_REDIS_URL) shared across workers, keyed by
+    the normalized query text.
+    
+    Cached embeddings live in one contiguous float32 matrix, normalized on insert, so
+    a semantic probe is a single matrix-vector product over every slot.
+    """
+    
+    def __init__(self, max_size: int = 100):
+        self.max_size = max_size
+        # (tenant_id, normalized query) -> (matrix row, result)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[int, Dict[str, Any]]]" = OrderedDict()
+        self._vectors: Optional[np.ndarray] = None  # (max_size, dim), allocated on first insert
+        self._slot_tenants = np.full(max_size, None, dtype=object)
+        self._slot_keys: List[Optional[Tuple[str, str]]] = [None] * max_size
+        self._free_slots = list(range(max_size - 1, -1, -1))
+        self._lock = threading.Lock()
+        # Lookup outcomes and time spent in lookups, reported by stats()
+        self._counters = {"exact_hits": 0, "redis_hits": 0, "semantic_hits": 0, "misses": 0}
+        self._lookup_seconds = 0.0
+        self.redis = None
+        
+        redis_url = os.getenv("QUERY_CACHE_REDIS_URL")
+        if redis_url:
+            try:
+                import redis
+                self.redis = redis.Redis.from_url(redis_url, socket_timeout=0.5)
+                logger.info("✅ Query cache L2 (Redis) enabled")
+            except ImportError:
+                logger.warning("redis library not available, query cache runs in-process only")
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return re.sub(r'\s+', ' ', query.lower()).strip()
+    
+    def _redis_key(self, tenant_id: str, normalized: str) -> str:
+        return f"memory:{tenant_id}:{hashlib.sha1(normalized.encode()).hexdigest()}"
+    
+    def _record(self, outcome: Optional[str], start: float):
+        with self._lock:
+            if outcome is not None:
+                self._counters[outcome] += 1
+            self._lookup_seconds += time.perf_counter() - start
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and average lookup latency since startup"""
+        with self._lock:
+            counters = dict(self._counters)
+            lookup_seconds = self._lookup_seconds
+        lookups = counters["exact_hits"] + counters["redis_hits"] + counters["semantic_hits"] + counters["misses"]
+        return {
+            **counters,
+            "entries": len(self._entries),
+            "hit_rate": (lookups - counters["misses"]) / lookups if lookups else 0.0,
+            "avg_lookup_ms": lookup_seconds * 1000 / lookups if lookups else 0.0
+        }
+    
+    def get(self, tenant_id: str, query: str) -> Optional[Dict[str, Any]]:
+        """Exact-match lookup (after normalization), L1 then L2"""
+        start = time.perf_counter()
+        normalized = self._normalize(query)
+        key = (tenant_id, normalized)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counters["exact_hits"] += 1
+                self._lookup_seconds += time.perf_counter() - start
+                return entry[1]
+        
+        result = None
+        if self.redis is not None:
+            try:
+                cached = self.redis.get(self._redis_key(tenant_id, normalized))
+            except Exception as e:
+                logger.warning(f"Query cache Redis lookup failed: {e}")
+                cached = None
+            if cached:
+                result = json.loads(cached)
+        # An exact miss is only counted once get_similar has missed too
+        self._record("redis_hits" if result is not None else None, start)
+        return result
+    
+    def get_similar(self, tenant_id: str, query_embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """Nearest cached query for this tenant by cosine similarity, if close enough"""
+        start = time.perf_counter()
+        result, key, score = self._nearest(tenant_id, query_embedding)
+        self._record("semantic_hits" if result is not None else "misses", start)
+        if result is not None:
+            logger.info(f"🧭 Semantic cache hit (similarity {score:.3f}) for cached query '{key[1][:60]}'")
+        return result
+    
+    def _nearest(self, tenant_id: str, query_embedding: List[float]):
+        query_vec = np.asarray(query_embedding, dtype=np.float32)
+        query_vec /= max(float(np.linalg.norm(query_vec)), 1e-12)
+        
+        with self._lock:
+            if not self._entries or self._vectors is None or self._vectors.shape[1] != query_vec.shape[0]:
+                return None, None, 0.0
+            scores = self._vectors @ query_vec
+            scores[self._slot_tenants != tenant_id] = -np.inf
+            slot = int(np.argmax(scores))
+            score = float(scores[slot])
+            if score < SIMILARITY_THRESHOLD:
+                return None, None, score
+            key = self._slot_keys[slot]
+            self._entries.move_to_end(key)
+            return self._entries[key][1], key, score
+    
+    def put(self, tenant_id: str, query: str, query_embedding: List[float], result: Dict[str, Any]):
+        """Store a result in L1 (evicting the least recently used entry) and L2"""
+        normalized = self._normalize(query)
+        key = (tenant_id, normalized)
+        vector = np.asarray(query_embedding, dtype=np.float32)
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+            if key in self._entries:
+                slot = self._entries[key][0]
+            else:
+                if not self._free_slots:
+                    _, (evicted_slot, _) = self._entries.popitem(last=False)
+                    self._slot_tenants[evicted_slot] = None
+                    self._slot_keys[evicted_slot] = None
+                    self._free_slots.append(evicted_slot)
+                slot = self._free_slots.pop()
+            if vector.shape[0] == self._vectors.shape[1]:
+                self._vectors[slot] = vector
+                self._slot_tenants[slot] = tenant_id
+            self._slot_keys[slot] = key
+            self._entries[key] = (slot, result)
+            self._entries.move_to_end(key)
+        
+        if self.redis is not None:
+            try:
+                self.redis.set(self._redis_key(tenant_id, normalized), json.dumps(result, default=str),
+                               ex=REDIS_TTL_SECONDS)
+            except Exception as e:
+                logger.warning(f"Query cache Redis store failed: {e}")
+    
+    def invalidate(self, tenant_id: str):
+        """Forget every cached answer for a tenant, in L1 and L2, once its documents change"""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == tenant_id]
+            for key in stale:
+                slot, _ = self._entries.pop(key)
+                self._vectors[slot] = 0.0
+                self._slot_tenants[slot] = None
+                self._slot_keys[slot] = None
+                self._free_slots.append(slot)
+        
+        removed = 0
+        if self.redis is not None:
+            try:
+                pattern = re.sub(r'([*?\[\]\\])', r'\\\1', f"memory:{tenant_id}:") + "*"
+                batch = []
+                for redis_key in self.redis.scan_iter(match=pattern, count=REDIS_DELETE_BATCH_SIZE):
+                    batch.append(redis_key)
+                    if len(batch) == REDIS_DELETE_BATCH_SIZE:
+                        removed += self.redis.delete(*batch)
+                        batch = []
+                if batch:
+                    removed += self.redis.delete(*batch)
+            except Exception as e:
+                logger.warning(f"Query cache Redis invalidation failed for {tenant_id}: {e}")
+        
+        logger.info(f"🧹 Query cache invalidated for {tenant_id}: {len(stale)} in-process, {removed} Redis entries")
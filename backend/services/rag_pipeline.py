@@ -1,27 +1,110 @@
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.schema import HumanMessage, SystemMessage
-from typing import List, Dict, Any, Optional
-import uuid
+import matplotlib
+matplotlib.use('Agg')  # Non-interactive backend, selected once for the process
+import matplotlib.pyplot as plt
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import base64
+import io
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 import os
+import re
+import threading
 import time
 
 from db.pinecone_client import pinecone_client
 from db.mongodb_client import DocumentModel, ChatHistoryModel
 from services.embeddings import embedding_service
+from services.query_cache import QueryCache
+from services.local_index import local_vector_index
 from utils.file_processor import file_processor
 from smart_performance_monitor import log_performance
 from services.rich_content_generator import rich_content_generator
+from services.document_text import rebuild_document_text
 
 logger = logging.getLogger(__name__)
 
+# Characters shared by adjacent chunks; get_full_text strips it when stitching chunks back together
+CHUNK_OVERLAP = 100
+
+# Ingestion pipeline: chunks are embedded in batches and each batch is upserted as soon as
+# it resolves, so embedding latency and Pinecone round-trips overlap instead of stacking
+EMBEDDING_BATCH_SIZE = 200
+UPSERT_BATCH_SIZE = 100
+MAX_INFLIGHT_BATCHES = 5
+# Pinecone's REST client sends values as JSON; float32 embeddings print as ~18-digit floats.
+# Six decimals halves the upsert body and sits far below what recall is sensitive to
+EMBEDDING_DECIMALS = 6
+# Pinecone accepts at most 1000 IDs per delete call
+DELETE_BATCH_SIZE = 1000
+
+# Same check as bson's ObjectId.is_valid for the string doc_ids we store, without the parse
+OBJECT_ID_PATTERN = re.compile(r'[0-9a-fA-F]{24}')
+
+# Prompt budget for retrieved context; keeps the LLM call fast (Gemini bills and paces by tokens)
+MAX_CONTEXT_TOKENS = 500
+
+# Synthetic datasets for general-knowledge chart requests: name -> (data, title, chart type)
+EXAMPLE_CHART_TEMPLATES = {
+    # Projects and technologies example
+    "technology": ([
+        {"label": "React.js", "value": 35},
+        {"label": "Python", "value": 25}, 
+        {"label": "Node.js", "value": 20},
+        {"label": "Java", "value": 15},
+        {"label": "Other", "value": 5}
+    ], "Technology Distribution in Projects", "pie"),
+    # Sales/Revenue example
+    "revenue": ([
+        {"label": "Q1 2024", "value": 125000},
+        {"label": "Q2 2024", "value": 150000},
+        {"label": "Q3 2024", "value": 180000},
+        {"label": "Q4 2024", "value": 200000}
+    ], "Quarterly Revenue Trends", "bar"),
+    # Market share example
+    "market_share": ([
+        {"label": "Company A", "value": 40},
+        {"label": "Company B", "value": 30},
+        {"label": "Company C", "value": 20},
+        {"label": "Others", "value": 10}
+    ], "Market Share Distribution", "pie"),
+    # Performance metrics example
+    "performance": ([
+        {"label": "Customer Satisfaction", "value": 92},
+        {"label": "Response Time", "value": 85},
+        {"label": "Quality Score", "value": 88},
+        {"label": "Efficiency", "value": 90}
+    ], "Performance Metrics Overview", "bar"),
+    # Generic example data
+    "generic": ([
+        {"label": "Category A", "value": 30},
+        {"label": "Category B", "value": 25},
+        {"label": "Category C", "value": 25},
+        {"label": "Category D", "value": 20}
+    ], "Sample Data Distribution", "pie"),
+}
+
+# Chart-request keywords, classified in one scan of the query (substring semantics, like `in`)
+CHART_KEYWORD_PATTERN = re.compile(r'chart|graph|visualize|plot|project|technolog|sales|revenue|market|share|performance|metric')
+VISUALIZATION_KEYWORDS = {"chart", "graph", "visualize", "plot"}
+# First template whose keyword groups are all hit wins; each group needs any one of its keywords
+EXAMPLE_CHART_RULES = [
+    ("technology", [{"project"}, {"technolog"}]),
+    ("revenue", [{"sales", "revenue"}]),
+    ("market_share", [{"market"}, {"share"}]),
+    ("performance", [{"performance", "metric"}]),
+]
+
 class RAGPipeline:
     def __init__(self):
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=600,  # Balanced for quality and speed
-            chunk_overlap=100,  # Sufficient overlap for context preservation
+            chunk_overlap=CHUNK_OVERLAP,  # Sufficient overlap for context preservation
             length_function=len,
         )
         self.llm = ChatGoogleGenerativeAI(
@@ -31,16 +114,29 @@ class RAGPipeline:
             max_output_tokens=800,  # Sufficient for quality responses
             streaming=False  # Keep non-streaming for now, but optimized settings
         )
-        # Simple in-memory cache for similar queries (production should use Redis)
-        self.query_cache = {}
+        # Exact + semantic query cache: in-process LRU, optionally backed by Redis
         self.cache_max_size = 100
+        self.query_cache = QueryCache(max_size=self.cache_max_size)
+        # Rendered example charts keyed by (title, chart type, data); pyplot is not thread-safe
+        self._example_chart_cache: Dict[tuple, Dict[str, Any]] = {}
+        self._chart_lock = threading.Lock()
+        threading.Thread(target=self._prerender_example_charts, daemon=True).start()
+        # Rich content only needs the query and the matches, so it is built while the LLM answers
+        self._rich_content_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rich-content")
     
     def process_document(self, file_path: str, file_name: str, 
                              file_content: bytes, tenant_id: str, user_id: str) -> str:
         """Process uploaded document: extract text, create embeddings, store metadata"""
+        return asyncio.run(self.process_document_async(file_path, file_name, file_content, tenant_id, user_id))
+    
+    async def process_document_async(self, file_path: str, file_name: str, 
+                                     file_content: bytes, tenant_id: str, user_id: str) -> str:
+        """Process uploaded document with embedding batches pipelined into Pinecone upserts"""
+        doc_id = None
+        vector_ids = []
         try:
             # Extract text from file
-            text_content = file_processor.extract_text(file_name, file_content)
+            text_content = await asyncio.to_thread(file_processor.extract_text, file_name, file_content)
             if not text_content:
                 raise ValueError("No text content extracted from file")
             
@@ -48,28 +144,7 @@ class RAGPipeline:
             chunks = self.text_splitter.split_text(text_content)
             logger.info(f"Split document into {len(chunks)} chunks")
             
-            # Generate embeddings for chunks
-            embeddings = embedding_service.embed_documents(chunks)
-            
-            # Prepare vectors for Pinecone
-            vectors = []
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                vector_id = f"{tenant_id}_{file_name}_{i}_{uuid.uuid4().hex[:8]}"
-                vectors.append({
-                    "id": vector_id,
-                    "values": embedding,
-                    "metadata": {
-                        "tenant_id": tenant_id,
-                        "file_name": file_name,
-                        "file_path": file_path,
-                        "chunk_index": i,
-                        "text": chunk,
-                        "uploaded_by": user_id,
-                        "upload_date": datetime.utcnow().isoformat()
-                    }
-                })
-            
-            # Store document metadata in MongoDB first to get the doc_id
+            # Store document metadata in MongoDB first so every vector carries doc_id as soon as it is embedded
             doc_metadata = {
                 "tenant_id": tenant_id,
                 "file_name": file_name,
@@ -77,25 +152,88 @@ class RAGPipeline:
                 "file_size": len(file_content),
                 "chunk_count": len(chunks),
                 "uploaded_by": user_id,
-                "text_preview": text_content[:1000] + "..." if len(text_content) > 1000 else text_content,
-                "full_text": text_content  # Store full text for complete preview
+                "text_preview": text_content[:1000] + "..." if len(text_content) > 1000 else text_content
+                # The full text is not duplicated here; get_full_text rebuilds it from the chunks
             }
             
-            doc_id = DocumentModel.create_document(doc_metadata)
+            doc_id = await asyncio.to_thread(DocumentModel.create_document, doc_metadata)
+            
+            # The Mongo doc_id already makes vector IDs unique: no per-chunk random suffix, and IDs are
+            # deterministic per document (file_name lives in metadata, not in the ID)
+            id_prefix = f"{tenant_id}_{doc_id}_"
+            
+            # Metadata shared by every chunk of this document
+            document_metadata = {
+                "file_name": file_name,
+                "file_path": file_path,
+                "uploaded_by": user_id,
+                "upload_date": datetime.now(timezone.utc).isoformat(),
+                "doc_id": doc_id
+            }
+            
+            semaphore = asyncio.Semaphore(MAX_INFLIGHT_BATCHES)
+            
+            async def upsert_batch(vectors: List[tuple]):
+                # Recorded before the call: a failed upsert may still have written part of the batch
+                vector_ids.extend(vector_id for vector_id, _, _ in vectors)
+                async with semaphore:
+                    await asyncio.to_thread(pinecone_client.upsert_vectors, vectors, tenant_id)
+                local_vector_index.add(tenant_id, vectors)
+            
+            async def embed_batch(start: int, tg: asyncio.TaskGroup):
+                batch_chunks = chunks[start:start + EMBEDDING_BATCH_SIZE]
+                async with semaphore:
+                    embeddings = await embedding_service.aembed_documents(batch_chunks)
+                embeddings = np.round(np.asarray(embeddings, dtype=np.float64), EMBEDDING_DECIMALS).tolist()
+                
+                # Prepare vectors for Pinecone as parallel ids / values / metadata columns, zipped into
+                # the (id, values, metadata) tuples the client accepts - no per-vector wrapper dicts.
+                # Metadata carries only what queries read back (plus provenance); the tenant is
+                # already the namespace, so it isn't repeated per vector
+                indices = range(start, start + len(batch_chunks))
+                ids = [f"{id_prefix}{i}" for i in indices]
+                metadatas = [
+                    {
+                        **document_metadata,
+                        "chunk_index": i,
+                        "text": chunk
+                    }
+                    for i, chunk in zip(indices, batch_chunks)
+                ]
+                vectors = list(zip(ids, embeddings, metadatas))
+                
+                # Start upserting this batch right away; later embedding batches keep running
+                for offset in range(0, len(vectors), UPSERT_BATCH_SIZE):
+                    tg.create_task(upsert_batch(vectors[offset:offset + UPSERT_BATCH_SIZE]))
             
-            # Update vectors with doc_id in metadata
-            for vector in vectors:
-                vector["metadata"]["doc_id"] = doc_id
+            async with asyncio.TaskGroup() as tg:
+                for start in range(0, len(chunks), EMBEDDING_BATCH_SIZE):
+                    tg.create_task(embed_batch(start, tg))
             
-            # Store vectors in Pinecone with doc_id included
-            pinecone_client.upsert_vectors(vectors, namespace=tenant_id)
+            # Answers cached before this document existed may now be incomplete
+            self.query_cache.invalidate(tenant_id)
             logger.info(f"Document processed successfully: {doc_id}")
             
             return doc_id
             
         except Exception as e:
-            logger.error(f"Document processing failed: {e}")
-            raise
+            # Report the first failed batch rather than the TaskGroup wrapper
+            error = e.exceptions[0] if isinstance(e, ExceptionGroup) else e
+            logger.error(f"Document processing failed: {error}")
+            if doc_id:
+                # Don't leave a document record or orphaned vectors behind for a failed ingest
+                await asyncio.to_thread(self._discard_failed_document, doc_id, tenant_id, vector_ids)
+            raise error
+    
+    def _discard_failed_document(self, doc_id: str, tenant_id: str, vector_ids: List[str]):
+        """Remove whatever a failed ingest already wrote to Pinecone, the local index and MongoDB"""
+        local_vector_index.remove(tenant_id, vector_ids)
+        try:
+            for offset in range(0, len(vector_ids), DELETE_BATCH_SIZE):
+                pinecone_client.delete_vectors(vector_ids[offset:offset + DELETE_BATCH_SIZE], tenant_id)
+        except Exception as e:
+            logger.error(f"Failed to remove vectors of failed document {doc_id}: {e}")
+        DocumentModel.delete_document(doc_id, tenant_id)
     
     def query_documents(self, query: str, tenant_id: str, user_id: str, 
                             top_k: int = 2) -> Dict[str, Any]:  # Balanced for quality and speed
@@ -103,10 +241,9 @@ class RAGPipeline:
         pipeline_start_time = time.time()
         logger.info(f"🔍 RAG PIPELINE STARTED - Query: '{query[:100]}...', Tenant: {tenant_id}, Top-K: {top_k}")
         
-        # Check cache for similar queries (simple similarity check)
-        cache_key = f"{tenant_id}:{query.lower().strip()}"
-        if cache_key in self.query_cache:
-            cached_result = self.query_cache[cache_key]
+        # Check cache for the same query first - no embedding needed
+        cached_result = self.query_cache.get(tenant_id, query)
+        if cached_result is not None:
             logger.info(f"🚀 Cache hit! Returning cached result in <1ms")
             return cached_result
         
@@ -118,30 +255,32 @@ class RAGPipeline:
             embedding_time = (time.time() - embedding_start) * 1000
             logger.info(f"✅ Query embedding generated in {embedding_time:.2f}ms")
             
-            # Search similar chunks in Pinecone
+            # Paraphrases of a cached query reuse its answer, skipping Pinecone + LLM
+            cached_result = self.query_cache.get_similar(tenant_id, query_embedding)
+            if cached_result is not None:
+                return cached_result
+            
+            # Search similar chunks (local index when loaded, otherwise Pinecone)
             search_start = time.time()
-            logger.info(f"🌲 Searching Pinecone vector database (namespace: {tenant_id})...")
-            search_results = pinecone_client.query_vectors(
-                query_vector=query_embedding,
-                namespace=tenant_id,
-                top_k=top_k
-            )
+            search_results = self._search(query_embedding, tenant_id, top_k)
             search_time = (time.time() - search_start) * 1000
-            logger.info(f"🎯 Pinecone search completed in {search_time:.2f}ms - Found {len(search_results.matches) if search_results.matches else 0} matches")
+            logger.info(f"🎯 Vector search completed in {search_time:.2f}ms - Found {len(search_results.matches) if search_results.matches else 0} matches")
             
             # Handle cases with no relevant documents - provide general knowledge response
-            if not search_results.matches or max([match.score for match in search_results.matches]) < 0.3:
+            top_score = max((match.score for match in search_results.matches or []), default=0.0)
+            if top_score < 0.3:
                 logger.info(f"⚠️  No relevant documents found (threshold: 0.3) - Using general knowledge response")
+                # Generate rich content for general knowledge responses too, alongside the LLM call
+                rich_content_future = self._rich_content_pool.submit(
+                    self._timed, self._generate_rich_content_for_general_query, query)
+                
                 casual_start = time.time()
                 # Generate response using general knowledge for casual conversations
                 casual_answer = self._generate_casual_response(query)
                 casual_time = (time.time() - casual_start) * 1000
                 logger.info(f"🎓 General knowledge response generated in {casual_time:.2f}ms")
                 
-                # Generate rich content for general knowledge responses too
-                rich_content_start = time.time()
-                rich_content = self._generate_rich_content_for_general_query(query)
-                rich_content_time = (time.time() - rich_content_start) * 1000
+                rich_content, rich_content_time = rich_content_future.result()
                 
                 # Note: Chat history will be saved by the calling route
                 
@@ -160,68 +299,33 @@ class RAGPipeline:
             # Extract relevant chunks and sources
             context_extract_start = time.time()
             logger.info(f"📋 Extracting context from {len(search_results.matches)} search results...")
-            relevant_chunks = []
-            sources = []
-            
-            # Pre-import ObjectId for efficiency
-            from bson import ObjectId
-            
-            for match in search_results.matches:
-                metadata = match.metadata
-                logger.info(f"📄 Processing match: {metadata.get('file_name', 'Unknown')} (Score: {match.score:.3f})")
-                relevant_chunks.append(metadata["text"])
-                
-                # Get doc_id from metadata (should be available in newer documents)
-                doc_id = metadata.get("doc_id")
-                
-                # Only include sources with valid doc_id to prevent file not found errors
-                if doc_id and ObjectId.is_valid(doc_id):
-                    source_info = {
-                        "file_name": metadata["file_name"],
-                        "file_id": doc_id,
-                        "file_path": metadata.get("file_path"),
-                        "chunk_index": metadata.get("chunk_index", 0),
-                        "text": metadata["text"],
-                        "score": match.score
-                    }
-                    sources.append(source_info)
-                else:
-                    logger.warning(f"Invalid or missing doc_id for file {metadata.get('file_name', 'Unknown')}, skipping source")
-            
+            context, sources = self._extract_context(search_results.matches)
             context_extract_time = (time.time() - context_extract_start) * 1000
-            logger.info(f"✅ Context extraction completed in {context_extract_time:.2f}ms - {len(relevant_chunks)} chunks, {len(sources)} sources")
+            logger.info(f"✅ Context extraction completed in {context_extract_time:.2f}ms - {len(search_results.matches)} chunks, {len(sources)} sources")
+            
+            # Generate rich content (tables, charts, images) while the LLM writes the answer
+            rich_content_future = self._rich_content_pool.submit(
+                self._timed, self._generate_rich_content, search_results.matches, query)
             
             # Generate answer using LLM with optimized context
             llm_start = time.time()
-            context = "\n\n".join(relevant_chunks)
-            
-            # Smart context optimization: limit context to prevent LLM slowdown
-            max_context_length = 2000  # Optimal length for fast processing
-            if len(context) > max_context_length:
-                # Truncate but keep the most relevant parts
-                context = context[:max_context_length] + "..."
-                logger.info(f"📝 Context truncated to {max_context_length} chars for optimal performance")
-            
             logger.info(f"🤖 Generating LLM response with {len(context)} characters of context...")
             answer = self._generate_answer(query, context)
             llm_time = (time.time() - llm_start) * 1000
             logger.info(f"🎯 LLM response generated in {llm_time:.2f}ms")
             
+            rich_content, rich_content_time = rich_content_future.result()
+            
             # Note: Chat history will be saved by the calling route to avoid duplication
             
             pipeline_total_time = (time.time() - pipeline_start_time) * 1000
             logger.info(f"🏁 RAG PIPELINE COMPLETED in {pipeline_total_time:.2f}ms")
             logger.info(f"📊 PERFORMANCE BREAKDOWN - Embedding: {embedding_time:.1f}ms, Search: {search_time:.1f}ms, Context: {context_extract_time:.1f}ms, LLM: {llm_time:.1f}ms")
             
-            # Generate rich content (tables, charts, images)
-            rich_content_start = time.time()
-            rich_content = self._generate_rich_content(answer, search_results.matches, query)
-            rich_content_time = (time.time() - rich_content_start) * 1000
-            
             result = {
                 "answer": answer,
                 "sources": self._format_sources(sources),
-                "confidence": max([match.score for match in search_results.matches]),
+                "confidence": top_score,
                 "rich_content": rich_content,
                 "processing_metadata": {
                     "rich_content_time_ms": rich_content_time
@@ -229,12 +333,7 @@ class RAGPipeline:
             }
             
             # Cache the result for future similar queries
-            if len(self.query_cache) >= self.cache_max_size:
-                # Remove oldest entry (simple FIFO)
-                oldest_key = next(iter(self.query_cache))
-                del self.query_cache[oldest_key]
-            
-            self.query_cache[cache_key] = result
+            self.query_cache.put(tenant_id, query, query_embedding, result)
             logger.info(f"💾 Result cached for future similar queries")
             
             # Log performance metrics for monitoring
@@ -253,8 +352,143 @@ class RAGPipeline:
             logger.error(f"💥 RAG PIPELINE FAILED after {pipeline_total_time:.2f}ms - Error: {e}")
             raise
     
-    def _generate_answer(self, query: str, context: str) -> str:
-        """Generate answer using LLM based on context"""
+    async def stream_query_documents(self, query: str, tenant_id: str, user_id: str,
+                                     top_k: int = 2) -> AsyncIterator[Dict[str, Any]]:
+        """Query documents, streaming the answer as the LLM writes it.
+        
+        Yields {"type": "token", "content": ...} events, then a single
+        {"type": "complete", ...} event with sources, confidence and rich content
+        (built in the background while tokens stream, so it never delays the first one).
+        """
+        stream_start = time.time()
+        logger.info(f"🔍 RAG STREAM STARTED - Query: '{query[:100]}...', Tenant: {tenant_id}, Top-K: {top_k}")
+        
+        cached_result = self.query_cache.get(tenant_id, query)
+        if cached_result is None:
+            query_embedding = await asyncio.to_thread(embedding_service.embed_text, query)
+            cached_result = self.query_cache.get_similar(tenant_id, query_embedding)
+        if cached_result is not None:
+            logger.info(f"🚀 Cache hit! Streaming cached result")
+            yield {"type": "token", "content": cached_result["answer"]}
+            yield {"type": "complete", **{key: value for key, value in cached_result.items() if key != "answer"}}
+            return
+        
+        search_results = await asyncio.to_thread(self._search, query_embedding, tenant_id, top_k)
+        top_score = max((match.score for match in search_results.matches or []), default=0.0)
+        general_knowledge = top_score < 0.3
+        
+        if general_knowledge:
+            messages = self._casual_messages(query)
+            rich_content_task = asyncio.create_task(
+                asyncio.to_thread(self._generate_rich_content_for_general_query, query))
+        else:
+            context, sources = self._extract_context(search_results.matches)
+            messages = self._answer_messages(query, context)
+            rich_content_task = asyncio.create_task(
+                asyncio.to_thread(self._generate_rich_content, search_results.matches, query))
+        
+        answer_parts = []
+        stream_failed = False
+        try:
+            async for chunk in self.llm.astream(messages):
+                if chunk.content:
+                    if not answer_parts:
+                        logger.info(f"⚡ First token after {(time.time() - stream_start) * 1000:.2f}ms")
+                    answer_parts.append(chunk.content)
+                    yield {"type": "token", "content": chunk.content}
+        except Exception as e:
+            logger.error(f"💥 LLM streaming failed: {e}")
+            stream_failed = True
+            if not answer_parts:
+                answer_parts.append("I apologize, but I encountered an error while generating the answer. Please try again.")
+                yield {"type": "token", "content": answer_parts[0]}
+        answer = "".join(answer_parts).strip()
+        
+        rich_content = await rich_content_task
+        if general_knowledge:
+            yield {
+                "type": "complete",
+                "sources": [],
+                "confidence": 0.8,
+                "response_type": "general_knowledge",
+                "rich_content": rich_content
+            }
+            return
+        
+        result = {
+            "answer": answer,
+            "sources": self._format_sources(sources),
+            "confidence": top_score,
+            "rich_content": rich_content,
+            "processing_metadata": {}
+        }
+        if not stream_failed:
+            self.query_cache.put(tenant_id, query, query_embedding, result)
+        logger.info(f"🏁 RAG STREAM COMPLETED in {(time.time() - stream_start) * 1000:.2f}ms")
+        yield {"type": "complete", **{key: value for key, value in result.items() if key != "answer"}}
+    
+    def _search(self, query_embedding: List[float], tenant_id: str, top_k: int):
+        """Nearest chunks from the in-process index if it holds this tenant, else from Pinecone"""
+        local_results = local_vector_index.search(tenant_id, query_embedding, top_k)
+        if local_results is not None:
+            logger.info(f"🗂️  Served search from local index (namespace: {tenant_id})")
+            return local_results
+        
+        logger.info(f"🌲 Searching Pinecone vector database (namespace: {tenant_id})...")
+        return pinecone_client.query_vectors(
+            query_vector=query_embedding,
+            namespace=tenant_id,
+            top_k=top_k
+        )
+    
+    def _extract_context(self, matches: List) -> Tuple[str, List[Dict]]:
+        """Build the LLM context and the citable sources from Pinecone matches"""
+        sources = []
+        
+        # Smart context optimization: fill a token budget with whole chunks, best match first,
+        # instead of joining everything and cutting the result mid-chunk
+        selected_chunks = []
+        remaining_tokens = MAX_CONTEXT_TOKENS
+        
+        for match in matches:
+            metadata = match.metadata
+            logger.info(f"📄 Processing match: {metadata.get('file_name', 'Unknown')} (Score: {match.score:.3f})")
+            
+            if remaining_tokens > 0:
+                words = metadata["text"].split()
+                chunk_tokens = len(words) * 1.3  # Rough token estimate
+                if chunk_tokens <= remaining_tokens:
+                    selected_chunks.append(metadata["text"])
+                    remaining_tokens -= chunk_tokens
+                elif not selected_chunks:
+                    # Even the best chunk is over budget: keep its leading words
+                    selected_chunks.append(" ".join(words[:int(remaining_tokens / 1.3)]) + "...")
+                    remaining_tokens = 0
+            
+            # Get doc_id from metadata (should be available in newer documents)
+            doc_id = metadata.get("doc_id")
+            
+            # Only include sources with valid doc_id to prevent file not found errors
+            if doc_id and OBJECT_ID_PATTERN.fullmatch(doc_id):
+                source_info = {
+                    "file_name": metadata["file_name"],
+                    "file_id": doc_id,
+                    "file_path": metadata.get("file_path"),
+                    "chunk_index": metadata.get("chunk_index", 0),
+                    "text": metadata["text"],
+                    "score": match.score
+                }
+                sources.append(source_info)
+            else:
+                logger.warning(f"Invalid or missing doc_id for file {metadata.get('file_name', 'Unknown')}, skipping source")
+        
+        if len(selected_chunks) < len(matches):
+            logger.info(f"📝 Context limited to {len(selected_chunks)}/{len(matches)} chunks (~{MAX_CONTEXT_TOKENS} token budget)")
+        
+        return "\n\n".join(selected_chunks), sources
+    
+    def _answer_messages(self, query: str, context: str) -> List:
+        """Prompt for answering from retrieved context"""
         system_prompt = """Based on the provided context, give a comprehensive but focused answer.
 
 Context: {context}
@@ -263,10 +497,23 @@ Question: {query}
 
 Answer:"""
         
-        messages = [
+        return [
             SystemMessage(content="Provide concise, accurate answers based on context."),
             HumanMessage(content=system_prompt.format(context=context, query=query))
         ]
+    
+    def _casual_messages(self, query: str) -> List:
+        """Prompt for general-knowledge answers when no document is relevant"""
+        system_prompt = """You are a professional AI assistant. Provide well-structured, informative answers using bullet points, headings, and clear organization when helpful."""
+
+        return [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=f"Question: {query}\n\nProvide a comprehensive, accurate, and helpful response:")
+        ]
+    
+    def _generate_answer(self, query: str, context: str) -> str:
+        """Generate answer using LLM based on context"""
+        messages = self._answer_messages(query, context)
         
         try:
             gemini_start = time.time()
@@ -287,12 +534,7 @@ Answer:"""
     
     def _generate_casual_response(self, query: str) -> str:
         """Generate response for casual conversations using general knowledge"""
-        system_prompt = """You are a professional AI assistant. Provide well-structured, informative answers using bullet points, headings, and clear organization when helpful."""
-
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=f"Question: {query}\n\nProvide a comprehensive, accurate, and helpful response:")
-        ]
+        messages = self._casual_messages(query)
         
         try:
             casual_gemini_start = time.time()
@@ -307,29 +549,34 @@ Answer:"""
 
     def _format_sources(self, sources: List[Dict]) -> List[Dict]:
         """Format sources for display with file access information"""
-        formatted_sources = []
-        seen_files = set()
+        # One entry per file, first (highest-ranked) chunk wins; dicts keep insertion order
+        formatted_sources = {}
         
         for source in sources:
             file_name = source["file_name"]
-            if file_name not in seen_files:
-                formatted_sources.append({
+            if file_name not in formatted_sources:
+                formatted_sources[file_name] = {
                     "file_name": file_name,
                     "file_id": source.get("file_id"),
                     "file_path": source.get("file_path"),
                     "page_number": source.get("page_number"),
                     "chunk_text": source.get("text", ""),  # Show complete chunk text - no truncation for employee trust
                     "relevance_score": source.get("score", 0.0)
-                })
-                seen_files.add(file_name)
+                }
         
-        return formatted_sources
+        return list(formatted_sources.values())
+    
+    def _timed(self, fn, *args) -> Tuple[Any, float]:
+        """Run fn and return (result, elapsed ms)"""
+        start = time.time()
+        result = fn(*args)
+        return result, (time.time() - start) * 1000
     
-    def _generate_rich_content(self, answer: str, chunks: List, query: str) -> Dict[str, Any]:
-        """Generate rich content (tables, charts, images) from answer and context"""
+    def _generate_rich_content(self, chunks: List, query: str) -> Dict[str, Any]:
+        """Generate rich content (tables, charts, images) from the retrieved context"""
         try:
-            # Combine all chunk text for analysis
-            combined_text = answer + "\n\n"
+            # Combine all chunk text for analysis; the answer is derived from these same chunks
+            combined_text = ""
             for chunk in chunks:
                 combined_text += chunk.metadata.get('text', '') + "\n"
             
@@ -366,67 +613,15 @@ Answer:"""
     def _generate_rich_content_for_general_query(self, query: str) -> Dict[str, Any]:
         """Generate rich content for general knowledge queries (synthetic data examples)"""
         try:
-            query_lower = query.lower()
+            keywords = set(CHART_KEYWORD_PATTERN.findall(query.lower()))
             
             # Check if user is asking for specific visualizations
-            if any(keyword in query_lower for keyword in ['chart', 'graph', 'visualize', 'plot', 'pie chart', 'bar chart']):
+            if keywords & VISUALIZATION_KEYWORDS:
                 
-                # Generate example data based on query context
-                if 'project' in query_lower and 'technolog' in query_lower:
-                    # Projects and technologies example
-                    example_data = [
-                        {"label": "React.js", "value": 35},
-                        {"label": "Python", "value": 25}, 
-                        {"label": "Node.js", "value": 20},
-                        {"label": "Java", "value": 15},
-                        {"label": "Other", "value": 5}
-                    ]
-                    chart_title = "Technology Distribution in Projects"
-                    chart_type = "pie"
-                    
-                elif 'sales' in query_lower or 'revenue' in query_lower:
-                    # Sales/Revenue example
-                    example_data = [
-                        {"label": "Q1 2024", "value": 125000},
-                        {"label": "Q2 2024", "value": 150000},
-                        {"label": "Q3 2024", "value": 180000},
-                        {"label": "Q4 2024", "value": 200000}
-                    ]
-                    chart_title = "Quarterly Revenue Trends"
-                    chart_type = "bar"
-                    
-                elif 'market' in query_lower and 'share' in query_lower:
-                    # Market share example
-                    example_data = [
-                        {"label": "Company A", "value": 40},
-                        {"label": "Company B", "value": 30},
-                        {"label": "Company C", "value": 20},
-                        {"label": "Others", "value": 10}
-                    ]
-                    chart_title = "Market Share Distribution"
-                    chart_type = "pie"
-                    
-                elif 'performance' in query_lower or 'metric' in query_lower:
-                    # Performance metrics example
-                    example_data = [
-                        {"label": "Customer Satisfaction", "value": 92},
-                        {"label": "Response Time", "value": 85},
-                        {"label": "Quality Score", "value": 88},
-                        {"label": "Efficiency", "value": 90}
-                    ]
-                    chart_title = "Performance Metrics Overview"
-                    chart_type = "bar"
-                    
-                else:
-                    # Generic example data
-                    example_data = [
-                        {"label": "Category A", "value": 30},
-                        {"label": "Category B", "value": 25},
-                        {"label": "Category C", "value": 25},
-                        {"label": "Category D", "value": 20}
-                    ]
-                    chart_title = "Sample Data Distribution"
-                    chart_type = "pie"
+                # Pick example data based on query context
+                template = next((name for name, groups in EXAMPLE_CHART_RULES
+                                 if all(group & keywords for group in groups)), "generic")
+                example_data, chart_title, chart_type = EXAMPLE_CHART_TEMPLATES[template]
                 
                 # Generate the chart
                 chart = self._create_example_chart(example_data, chart_title, chart_type)
@@ -446,7 +641,12 @@ Answer:"""
                         }],
                         "charts": [chart],
                         "images": [],
-                        "structured_data": [{"type": "example", "data": example_data, "chart_type": chart_type}],
+                        "structured_data": [{
+                            "type": "example",
+                            "labels": [item["label"] for item in example_data],
+                            "values": [item["value"] for item in example_data],
+                            "chart_type": chart_type
+                        }],
                         "summary_visualization": chart
                     }
             
@@ -468,16 +668,27 @@ Answer:"""
                 "images": []
             }
     
+    def _prerender_example_charts(self):
+        """Render every example template once so general-knowledge responses never wait on matplotlib"""
+        for example_data, chart_title, chart_type in EXAMPLE_CHART_TEMPLATES.values():
+            self._create_example_chart(example_data, chart_title, chart_type)
+        logger.info(f"📊 Pre-rendered {len(self._example_chart_cache)} example charts")
+    
     def _create_example_chart(self, data: List[Dict], title: str, chart_type: str) -> Optional[Dict[str, Any]]:
-        """Create an example chart from synthetic data"""
+        """Create an example chart from synthetic data (cached per dataset)"""
+        cache_key = (title, chart_type, tuple((item["label"], item["value"]) for item in data))
+        chart = self._example_chart_cache.get(cache_key)
+        if chart is None:
+            with self._chart_lock:
+                chart = self._example_chart_cache.get(cache_key)
+                if chart is None:
+                    chart = self._render_example_chart(data, title, chart_type)
+                    if chart:
+                        self._example_chart_cache[cache_key] = chart
+        return chart
+    
+    def _render_example_chart(self, data: List[Dict], title: str, chart_type: str) -> Optional[Dict[str, Any]]:
         try:
-            import matplotlib.pyplot as plt
-            import io
-            import base64
-            
-            # Set up matplotlib for non-interactive backend
-            plt.switch_backend('Agg')
-            
             fig, ax = plt.subplots(figsize=(10, 6))
             
             labels = [item["label"] for item in data]
@@ -507,7 +718,8 @@ Answer:"""
             
             # Convert to base64 image
             img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
+            # Screen resolution plus Pillow's optimizing encoder roughly halves the PNG payload
+            plt.savefig(img_buffer, format='png', dpi=96, bbox_inches='tight', pil_kwargs={'optimize': True})
             img_buffer.seek(0)
             img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
             plt.close(fig)
@@ -524,6 +736,20 @@ Answer:"""
             logger.error(f"Error creating example chart: {e}")
             return None
     
+    def get_full_text(self, doc_id: str, tenant_id: str) -> Optional[str]:
+        """Rebuild a document's full text from its chunks in Pinecone"""
+        try:
+            document = DocumentModel.get_document_by_id(doc_id, tenant_id)
+            if not document:
+                return None
+            
+            full_text = rebuild_document_text(tenant_id, doc_id, CHUNK_OVERLAP)
+            return full_text if full_text is not None else document.get("text_preview")
+            
+        except Exception as e:
+            logger.error(f"Full text reconstruction failed for {doc_id}: {e}")
+            return None
+    
     def delete_document(self, doc_id: str, tenant_id: str) -> bool:
         """Delete document and its embeddings"""
         try:
@@ -546,6 +772,9 @@ Answer:"""
             # Delete vectors from Pinecone (this is complex, would need to track vector IDs)
             # For now, we'll leave the vectors (they'll be filtered out by tenant_id anyway)
             
+            # Cached answers may cite the deleted document
+            self.query_cache.invalidate(tenant_id)
+            
             logger.info(f"Document deleted: {doc_id}")
             return True
             
@@ -1,10 +1,17 @@
 import re
 import json
+import hashlib
+from collections import OrderedDict
 import pandas as pd
-import matplotlib.pyplot as plt
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image, features
 import seaborn as sns
 import io
-import base64
+import binascii
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, Optional, Tuple
 import logging
 from datetime import datetime
@@ -12,18 +19,119 @@ import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Table patterns
+MARKDOWN_TABLE_PATTERN = re.compile(r'\|[^\n]+\|\n\|[-\s\|]+\|\n(\|[^\n]+\|\n)+', re.MULTILINE)
+STRUCTURED_PATTERNS = (
+    re.compile(r'(\w+):\s*([0-9,.$%]+)'),  # Key: Value pairs with numbers
+    re.compile(r'(\w+)\s+([0-9,.$%]+)'),   # Word followed by number
+)
+
+# Numerical data scanner: one alternative per data type, tried in priority order at
+# each position, so every labelled number is claimed by exactly one type
+NUMERICAL_DATA_PATTERN = re.compile(
+    r'(?P<percentage>(?P<percentage_label>\w+(?:\s+\w+)*)\s*:?\s*(?P<percentage_value>[0-9.]+)%)'
+    r'|(?P<currency>(?P<currency_label>\w+(?:\s+\w+)*)\s*:?\s*\$(?P<currency_value>[0-9,]+(?:\.[0-9]{2})?))'
+    r'|(?P<generic>(?P<generic_label>\w+(?:\s+\w+)*)\s*:?\s*(?P<generic_value>[0-9,]+(?:\.[0-9]+)?))'
+)
+# Year points get their own scan: a generic label spans whitespace and newlines, so in the
+# shared scan it would swallow the first year of a series ("Revenue by year\n2020: 100")
+TIME_SERIES_PATTERN = re.compile(r'(20\d{2})\s*:?\s*([0-9,]+(?:\.[0-9]+)?)')
+NUMERICAL_CHART_TYPES = {"percentage": "pie", "currency": "bar", "time_series": "line"}
+
+# Fixed margins instead of tight_layout, which costs an extra layout pass per chart
+CHART_MARGINS = {"left": 0.1, "right": 0.97, "top": 0.92, "bottom": 0.12}
+
+# WebP charts are a fraction of the PNG size in the JSON response; PNG if Pillow lacks WebP
+if features.check('webp'):
+    CHART_IMAGE_FORMAT, CHART_MIME_TYPE, CHART_SAVE_OPTIONS = 'WEBP', 'image/webp', {"quality": 85, "method": 4}
+else:
+    CHART_IMAGE_FORMAT, CHART_MIME_TYPE, CHART_SAVE_OPTIONS = 'PNG', 'image/png', {"optimize": False}
+
+# Charts for one analysis render concurrently, each on its own figure
+CHART_RENDER_WORKERS = 4
+
+# Memoized results; analyses hold rendered chart images so they get a smaller cap
+ANALYSIS_CACHE_SIZE = 128
+NUMERICAL_DATA_CACHE_SIZE = 4096
+
+# Time series markers: years, months, quarters
+MONTH_PATTERN = re.compile(r'(January|February|March|April|May|June|July|August|September|October|November|December)')
+TIME_PATTERNS = (
+    re.compile(r'20\d{2}'),
+    MONTH_PATTERN,
+    re.compile(r'Q[1-4]'),
+)
+
+# Regex scans only look at this much of a text, bounding their worst case on huge inputs;
+# charts only ever use the leading matches anyway
+MAX_SCANNED_CHARS = 200_000
+
+# Every numerical dataset and every year/quarter series needs at least two digits
+MIN_DIGITS = 2
+
+def _has_min_digits(text: str) -> bool:
+    # str.count runs in C, far cheaper than letting the regexes discover there is nothing to match
+    return sum(map(text.count, '0123456789')) >= MIN_DIGITS
+
+def _to_series(matches: List[Tuple[str, str]]) -> Dict[str, list]:
+    """(label, raw value) matches as parallel label and value lists"""
+    return {
+        "labels": [label.strip() for label, _ in matches],
+        "values": [float(value.replace(',', '')) for _, value in matches]
+    }
+
+def _content_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+class _LRUCache:
+    """Small thread-safe LRU mapping"""
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+    
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
 class RichContentGenerator:
     """Generate rich content (tables, charts, images) from text and data"""
     
     def __init__(self):
-        # Set up matplotlib for non-interactive backend
-        plt.switch_backend('Agg')
         sns.set_style("whitegrid")
-        plt.rcParams['figure.figsize'] = (10, 6)
-        plt.rcParams['font.size'] = 10
+        matplotlib.rcParams['figure.figsize'] = (10, 6)
+        matplotlib.rcParams['font.size'] = 10
+        # Labels are document text; '$' in currency labels must not switch to mathtext
+        matplotlib.rcParams['text.parse_math'] = False
+        
+        self._chart_pool = ThreadPoolExecutor(max_workers=CHART_RENDER_WORKERS, thread_name_prefix="chart-render")
+        # Encode buffers are reused per thread, since renders run concurrently
+        self._image_buffers = threading.local()
+        # Load the font cache now rather than on the first chart request
+        self._chart_pool.submit(self._warm_up)
+        
+        self._analysis_cache = _LRUCache(ANALYSIS_CACHE_SIZE)
+        self._numerical_data_cache = _LRUCache(NUMERICAL_DATA_CACHE_SIZE)
         
     def analyze_content_for_rich_elements(self, text: str, query: str) -> Dict[str, Any]:
         """Analyze text content to identify opportunities for rich content generation"""
+        cache_key = (_content_key(text), query)
+        cached = self._analysis_cache.get(cache_key)
+        if cached is not None:
+            # Callers add keys (e.g. summary_visualization) to the top-level dict
+            return dict(cached)
+        
         rich_content = {
             "has_tabular_data": False,
             "has_numerical_data": False,
@@ -58,16 +166,21 @@ class RichContentGenerator:
         # Detect time series data
         if self._has_time_series_data(text):
             rich_content["has_time_series"] = True
-            
-        return rich_content
+        
+        self._analysis_cache.put(cache_key, rich_content)
+        return dict(rich_content)
     
     def _extract_tables_from_text(self, text: str) -> List[Dict[str, Any]]:
         """Extract tabular data from text"""
         tables = []
         
-        # Pattern 1: Pipe-separated tables (Markdown style)
-        markdown_table_pattern = r'\|[^\n]+\|\n\|[-\s\|]+\|\n(\|[^\n]+\|\n)+'
-        markdown_matches = re.findall(markdown_table_pattern, text, re.MULTILINE)
+        text = text[:MAX_SCANNED_CHARS]
+        
+        # Pattern 1: Pipe-separated tables (Markdown style), which need pipes and at least three lines
+        if '|' in text and text.count('\n') >= 3:
+            markdown_matches = MARKDOWN_TABLE_PATTERN.findall(text)
+        else:
+            markdown_matches = []
         
         for match in markdown_matches:
             table_data = self._parse_markdown_table(match)
@@ -79,13 +192,8 @@ class RichContentGenerator:
                 })
         
         # Pattern 2: Structured data with consistent formatting
-        structured_patterns = [
-            r'(\w+):\s*([0-9,.$%]+)',  # Key: Value pairs with numbers
-            r'(\w+)\s+([0-9,.$%]+)',   # Word followed by number
-        ]
-        
-        for pattern in structured_patterns:
-            matches = re.findall(pattern, text)
+        for pattern in STRUCTURED_PATTERNS:
+            matches = pattern.findall(text)
             if len(matches) >= 3:  # At least 3 data points
                 table_data = {
                     "headers": ["Item", "Value"],
@@ -132,121 +240,142 @@ class RichContentGenerator:
     
     def _extract_numerical_data(self, text: str) -> List[Dict[str, Any]]:
         """Extract numerical data that could be visualized"""
-        numerical_data = []
+        if not _has_min_digits(text):
+            return []
         
-        # Pattern 1: Percentages with labels
-        percentage_pattern = r'(\w+(?:\s+\w+)*)\s*:?\s*([0-9.]+)%'
-        percentage_matches = re.findall(percentage_pattern, text)
+        cache_key = _content_key(text)
+        numerical_data = self._numerical_data_cache.get(cache_key)
+        if numerical_data is not None:
+            return numerical_data
         
-        if len(percentage_matches) >= 2:
-            numerical_data.append({
-                "type": "percentage",
-                "data": [{"label": label.strip(), "value": float(value)} for label, value in percentage_matches],
-                "chart_type": "pie"
-            })
-        
-        # Pattern 2: Currency amounts
-        currency_pattern = r'(\w+(?:\s+\w+)*)\s*:?\s*\$([0-9,]+(?:\.[0-9]{2})?)'
-        currency_matches = re.findall(currency_pattern, text)
-        
-        if len(currency_matches) >= 2:
-            numerical_data.append({
-                "type": "currency",
-                "data": [{"label": label.strip(), "value": float(value.replace(',', ''))} for label, value in currency_matches],
-                "chart_type": "bar"
-            })
+        numerical_data = []
+        text = text[:MAX_SCANNED_CHARS]
         
-        # Pattern 3: Year-based data (time series)
-        year_pattern = r'(20\d{2})\s*:?\s*([0-9,]+(?:\.[0-9]+)?)'
-        year_matches = re.findall(year_pattern, text)
+        matches = {data_type: [] for data_type in ("percentage", "currency", "time_series", "generic")}
         
-        if len(year_matches) >= 2:
-            numerical_data.append({
-                "type": "time_series",
-                "data": [{"label": year, "value": float(value.replace(',', ''))} for year, value in year_matches],
-                "chart_type": "line"
-            })
+        # Single pass over the text, bucketed by whichever data type matched
+        for match in NUMERICAL_DATA_PATTERN.finditer(text):
+            data_type = match.lastgroup
+            matches[data_type].append((match.group(f"{data_type}_label"), match.group(f"{data_type}_value")))
+        matches["time_series"] = TIME_SERIES_PATTERN.findall(text)
         
-        # Pattern 4: Generic number data
-        number_pattern = r'(\w+(?:\s+\w+)*)\s*:?\s*([0-9,]+(?:\.[0-9]+)?)'
-        number_matches = re.findall(number_pattern, text)
+        for data_type, chart_type in NUMERICAL_CHART_TYPES.items():
+            if len(matches[data_type]) >= 2:
+                numerical_data.append({
+                    "type": data_type,
+                    **_to_series(matches[data_type]),
+                    "chart_type": chart_type
+                })
         
-        if len(number_matches) >= 3 and not any(d["type"] in ["percentage", "currency", "time_series"] for d in numerical_data):
+        # Generic number data, only when no typed dataset was found
+        if len(matches["generic"]) >= 3 and not numerical_data:
             numerical_data.append({
                 "type": "generic",
-                "data": [{"label": label.strip(), "value": float(value.replace(',', ''))} for label, value in number_matches],
+                **_to_series(matches["generic"]),
                 "chart_type": "bar"
             })
         
+        self._numerical_data_cache.put(cache_key, numerical_data)
         return numerical_data
     
     def _generate_charts_from_data(self, numerical_data: List[Dict], query: str) -> List[Dict[str, Any]]:
         """Generate chart images from numerical data"""
-        charts = []
-        
-        for data_set in numerical_data:
-            try:
-                chart_data = data_set["data"]
-                chart_type = data_set["chart_type"]
-                data_type = data_set["type"]
-                
-                if len(chart_data) < 2:
-                    continue
-                
-                # Create the chart
-                fig, ax = plt.subplots(figsize=(10, 6))
-                
-                labels = [item["label"] for item in chart_data]
-                values = [item["value"] for item in chart_data]
-                
-                if chart_type == "pie":
-                    wedges, texts, autotexts = ax.pie(values, labels=labels, autopct='%1.1f%%', startangle=90)
-                    ax.set_title(f"{data_type.title()} Distribution")
-                    
-                elif chart_type == "bar":
-                    bars = ax.bar(labels, values)
-                    ax.set_title(f"{data_type.title()} Comparison")
-                    ax.set_ylabel("Value")
-                    
-                    # Add value labels on bars
-                    for bar, value in zip(bars, values):
-                        height = bar.get_height()
-                        ax.text(bar.get_x() + bar.get_width()/2., height,
-                               f'{value:,.0f}' if data_type == "currency" else f'{value}',
-                               ha='center', va='bottom')
-                    
-                    # Rotate x-axis labels if they're long
-                    if max(len(label) for label in labels) > 10:
-                        plt.xticks(rotation=45, ha='right')
-                        
-                elif chart_type == "line":
-                    ax.plot(labels, values, marker='o', linewidth=2, markersize=6)
-                    ax.set_title(f"{data_type.title()} Trend")
-                    ax.set_ylabel("Value")
-                    ax.grid(True, alpha=0.3)
-                
-                plt.tight_layout()
-                
-                # Convert to base64 image
-                img_buffer = io.BytesIO()
-                plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-                img_buffer.seek(0)
-                img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
-                plt.close(fig)
-                
-                charts.append({
-                    "type": chart_type,
-                    "data_type": data_type,
-                    "image": img_base64,
-                    "title": f"{data_type.title()} {'Distribution' if chart_type == 'pie' else 'Comparison' if chart_type == 'bar' else 'Trend'}",
-                    "description": f"Visual representation of {data_type} data from the document"
-                })
+        if len(numerical_data) == 1:
+            charts = [self._generate_chart(numerical_data[0])]
+        else:
+            charts = list(self._chart_pool.map(self._generate_chart, numerical_data))
+        return [chart for chart in charts if chart]
+    
+    def _generate_chart(self, data_set: Dict) -> Optional[Dict[str, Any]]:
+        """Render one dataset as a chart image"""
+        try:
+            labels = data_set["labels"]
+            values = data_set["values"]
+            chart_type = data_set["chart_type"]
+            data_type = data_set["type"]
+            
+            if len(labels) < 2:
+                return None
+            
+            img_base64 = self._render_chart(
+                (10, 6), 150 if chart_type == "pie" else 100,
+                lambda ax: self._draw_chart(ax, chart_type, data_type, labels, values)
+            )
+            
+            return {
+                "type": chart_type,
+                "data_type": data_type,
+                "image": img_base64,
+                "mime_type": CHART_MIME_TYPE,
+                "title": f"{data_type.title()} {'Distribution' if chart_type == 'pie' else 'Comparison' if chart_type == 'bar' else 'Trend'}",
+                "description": f"Visual representation of {data_type} data from the document"
+            }
+            
+        except Exception as e:
+            logger.error(f"Error generating chart: {e}")
+            return None
+    
+    def _draw_chart(self, ax, chart_type: str, data_type: str, labels: List[str], values: List[float]):
+        """Draw a pie, bar or line chart for one dataset"""
+        if chart_type == "pie":
+            ax.pie(values, labels=labels, autopct='%1.1f%%', startangle=90)
+            ax.set_title(f"{data_type.title()} Distribution")
+            
+        elif chart_type == "bar":
+            bars = ax.bar(labels, values)
+            ax.set_title(f"{data_type.title()} Comparison")
+            ax.set_ylabel("Value")
+            
+            # Add value labels on bars
+            for bar, value in zip(bars, values):
+                height = bar.get_height()
+                ax.text(bar.get_x() + bar.get_width()/2., height,
+                       f'{value:,.0f}' if data_type == "currency" else f'{value}',
+                       ha='center', va='bottom')
+            
+            # Rotate x-axis labels if they're long
+            if max(len(label) for label in labels) > 10:
+                for tick_label in ax.get_xticklabels():
+                    tick_label.set_rotation(45)
+                    tick_label.set_ha('right')
+                ax.figure.subplots_adjust(bottom=0.25)
                 
-            except Exception as e:
-                logger.error(f"Error generating chart: {e}")
-                continue
+        elif chart_type == "line":
+            ax.plot(labels, values, marker='o', linewidth=2, markersize=6)
+            ax.set_title(f"{data_type.title()} Trend")
+            ax.set_ylabel("Value")
+            ax.grid(True, alpha=0.3)
+    
+    def _render_chart(self, figsize: Tuple[float, float], dpi: int, draw) -> str:
+        """Draw onto a fresh Agg figure and return the result as a base64 image"""
+        # A figure per call keeps concurrent renders independent; without pyplot it is cheap
+        figure = Figure(figsize=figsize, dpi=dpi)
+        canvas = FigureCanvasAgg(figure)
+        figure.subplots_adjust(**CHART_MARGINS)
+        draw(figure.add_subplot(111))
+        canvas.draw()
         
-        return charts
+        img_buffer = getattr(self._image_buffers, "buffer", None)
+        if img_buffer is None:
+            img_buffer = self._image_buffers.buffer = io.BytesIO()
+        img_buffer.seek(0)
+        img_buffer.truncate(0)
+        Image.frombuffer('RGBA', canvas.get_width_height(), canvas.buffer_rgba(),
+                         'raw', 'RGBA', 0, 1).save(img_buffer, format=CHART_IMAGE_FORMAT, **CHART_SAVE_OPTIONS)
+        # Encode straight from the buffer's memory; the view must be released before the next truncate
+        with img_buffer.getbuffer() as image_bytes:
+            return binascii.b2a_base64(image_bytes, newline=False).decode('ascii')
+    
+    def _warm_up(self):
+        """Render a throwaway chart so font lookup and glyph caches are loaded"""
+        def draw(ax):
+            ax.plot([0, 1], [0, 1])
+            ax.set_title("warm-up")
+        
+        try:
+            self._render_chart((2, 2), 72, draw)
+        except Exception as e:
+            logger.warning(f"Chart renderer warm-up failed: {e}")
     
     def _has_comparison_keywords(self, query: str) -> bool:
         """Check if query suggests comparison visualization"""
@@ -259,47 +388,39 @@ class RichContentGenerator:
     
     def _has_time_series_data(self, text: str) -> bool:
         """Check if text contains time series data"""
-        time_patterns = [
-            r'20\d{2}',  # Years
-            r'(January|February|March|April|May|June|July|August|September|October|November|December)',  # Months
-            r'Q[1-4]',   # Quarters
-        ]
-        
-        for pattern in time_patterns:
-            if len(re.findall(pattern, text)) >= 2:
+        patterns = TIME_PATTERNS if _has_min_digits(text) else (MONTH_PATTERN,)
+        for pattern in patterns:
+            # Two hits are enough, no need to collect every match
+            matches = pattern.finditer(text)
+            if next(matches, None) and next(matches, None):
                 return True
         return False
     
     def generate_summary_visualization(self, sources: List[Dict], query: str) -> Optional[Dict[str, Any]]:
         """Generate a summary visualization from multiple sources"""
         try:
-            # Collect all numerical data from sources
-            all_data = []
-            
+            # Only the first dataset is charted, so stop scanning sources once one turns up
+            data_set = None
             for source in sources:
-                text = source.get("chunk_text", "")
-                numerical_data = self._extract_numerical_data(text)
-                all_data.extend(numerical_data)
+                numerical_data = self._extract_numerical_data(source.get("chunk_text", ""))
+                if numerical_data:
+                    data_set = numerical_data[0]
+                    break
             
-            if not all_data:
+            if data_set is None:
                 return None
             
             # Create a summary chart if we have enough data
-            if len(all_data) >= 1:
-                # Take the first dataset for summary
-                data_set = all_data[0]
-                chart_data = data_set["data"]
-                
-                if len(chart_data) >= 2:
-                    fig, ax = plt.subplots(figsize=(12, 8))
-                    
-                    labels = [item["label"] for item in chart_data]
-                    values = [item["value"] for item in chart_data]
-                    
+            labels = data_set["labels"]
+            values = data_set["values"]
+            
+            if len(labels) >= 2:
+                def draw_summary(ax):
                     # Create a horizontal bar chart for better readability
                     bars = ax.barh(labels, values)
                     ax.set_title(f"Summary: {query}", fontsize=14, fontweight='bold')
                     ax.set_xlabel("Value")
+                    ax.figure.subplots_adjust(left=0.25)
                     
                     # Add value labels
                     for bar, value in zip(bars, values):
@@ -307,23 +428,17 @@ class RichContentGenerator:
                         ax.text(width, bar.get_y() + bar.get_height()/2.,
                                f'{value:,.0f}',
                                ha='left', va='center', fontweight='bold')
-                    
-                    plt.tight_layout()
-                    
-                    # Convert to base64
-                    img_buffer = io.BytesIO()
-                    plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-                    img_buffer.seek(0)
-                    img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
-                    plt.close(fig)
-                    
-                    return {
-                        "type": "summary_chart",
-                        "image": img_base64,
-                        "title": f"Data Summary: {query}",
-                        "description": "Summary visualization based on your query and document data"
-                    }
-                    
+                
+                img_base64 = self._render_chart((12, 8), 100, draw_summary)
+                
+                return {
+                    "type": "summary_chart",
+                    "image": img_base64,
+                    "mime_type": CHART_MIME_TYPE,
+                    "title": f"Data Summary: {query}",
+                    "description": "Summary visualization based on your query and document data"
+                }
+                
         except Exception as e:
             logger.error(f"Error generating summary visualization: {e}")
         
@@ -1,14 +1,49 @@
 import boto3
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError, SSLError
 from botocore.config import Config
+import io
 import os
 import logging
+import threading
+import time
+from functools import lru_cache
+from types import MappingProxyType
 from typing import Optional
 import uuid
 import ssl
 
 logger = logging.getLogger(__name__)
 
+# Uploads above the threshold go up as parallel 8MB parts; the transfer manager retries parts itself
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=10,
+    use_threads=True
+)
+
+# Content type by lowercase file extension
+CONTENT_TYPES = MappingProxyType({
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'txt': 'text/plain',
+    'csv': 'text/csv',
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'gif': 'image/gif',
+    'bmp': 'image/bmp'
+})
+
+def _content_type_for_ext(extension: str) -> str:
+    """Get content type for a file extension"""
+    return CONTENT_TYPES.get(extension.lower(), 'application/octet-stream')
+
+# Presigned URLs are reused for the first half of their validity
+PRESIGNED_URL_CACHE_SIZE = 4096
+
 class S3Service:
     def __init__(self):
         self.aws_access_key = os.getenv("AWS_ACCESS_KEY_ID")
@@ -27,63 +62,49 @@ class S3Service:
             signature_version='s3v4'
         )
         
-        try:
-            self.s3_client = boto3.client(
-                's3',
-                aws_access_key_id=self.aws_access_key,
-                aws_secret_access_key=self.aws_secret_key,
-                config=config
-            )
-            # Test connection
-            self.s3_client.head_bucket(Bucket=self.bucket_name)
-            logger.info("S3 client initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize S3 client: {e}")
-            # Create a fallback client with basic configuration
-            config_fallback = Config(
-                region_name=self.region,
-                retries={'max_attempts': 3, 'mode': 'adaptive'}
-            )
-            self.s3_client = boto3.client(
-                's3',
-                aws_access_key_id=self.aws_access_key,
-                aws_secret_access_key=self.aws_secret_key,
-                config=config_fallback
-            )
+        # No connectivity probe here: bucket and credential errors surface on first use,
+        # where every operation already handles them
+        self.s3_client = boto3.client(
+            's3',
+            aws_access_key_id=self.aws_access_key,
+            aws_secret_access_key=self.aws_secret_key,
+            config=config
+        )
+        logger.info("S3 client initialized successfully")
+        
+        # (file_path, expiration) -> (url, time after which it is re-signed)
+        self._presigned_urls = {}
+        self._presigned_lock = threading.Lock()
     
     def upload_file(self, file_content: bytes, filename: str, tenant_id: str) -> Optional[str]:
         """Upload file to S3 and return the file path"""
         try:
             # Generate unique file path
-            file_extension = filename.split('.')[-1] if '.' in filename else ''
+            _, dot, file_extension = filename.rpartition('.')
+            if not dot:
+                file_extension = ''
             unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
             file_path = f"tenants/{tenant_id}/documents/{unique_filename}"
             
-            # Upload to S3 with retry logic
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    self.s3_client.put_object(
-                        Bucket=self.bucket_name,
-                        Key=file_path,
-                        Body=file_content,
-                        ContentType=self._get_content_type(filename),
-                        Metadata={
-                            'original_filename': filename,
-                            'tenant_id': tenant_id
-                        }
-                    )
-                    
-                    logger.info(f"File uploaded to S3: {file_path}")
-                    return file_path
-                    
-                except (SSLError, ssl.SSLError) as ssl_error:
-                    logger.warning(f"SSL error on attempt {attempt + 1}: {ssl_error}")
-                    if attempt == max_retries - 1:
-                        raise
-                    continue
-                    
-        except (ClientError, SSLError, ssl.SSLError) as e:
+            # Multipart above TRANSFER_CONFIG's threshold, single PUT below it
+            self.s3_client.upload_fileobj(
+                io.BytesIO(file_content),
+                self.bucket_name,
+                file_path,
+                ExtraArgs={
+                    'ContentType': _content_type_for_ext(file_extension),
+                    'Metadata': {
+                        'original_filename': filename,
+                        'tenant_id': tenant_id
+                    }
+                },
+                Config=TRANSFER_CONFIG
+            )
+            
+            logger.info(f"File uploaded to S3: {file_path}")
+            return file_path
+            
+        except (ClientError, S3UploadFailedError, SSLError, ssl.SSLError) as e:
             logger.error(f"S3 upload failed after retries: {e}")
             return None
         except Exception as e:
@@ -131,35 +152,39 @@ class S3Service:
     
     def generate_presigned_url(self, file_path: str, expiration: int = 3600) -> Optional[str]:
         """Generate presigned URL for file access"""
+        key = (file_path, expiration)
+        now = time.time()
+        with self._presigned_lock:
+            cached = self._presigned_urls.get(key)
+        if cached and now < cached[1]:
+            return cached[0]
+        
         try:
             url = self.s3_client.generate_presigned_url(
                 'get_object',
                 Params={'Bucket': self.bucket_name, 'Key': file_path},
                 ExpiresIn=expiration
             )
+            
+            with self._presigned_lock:
+                self._presigned_urls.pop(key, None)
+                if len(self._presigned_urls) >= PRESIGNED_URL_CACHE_SIZE:
+                    # Dicts keep insertion order, so this drops the oldest signature
+                    self._presigned_urls.pop(next(iter(self._presigned_urls)))
+                self._presigned_urls[key] = (url, now + expiration / 2)
             return url
             
         except ClientError as e:
             logger.error(f"Presigned URL generation failed: {e}")
             return None
-    
-    def _get_content_type(self, filename: str) -> str:
-        """Get content type based on file extension"""
-        extension = filename.split('.')[-1].lower() if '.' in filename else ''
-        
-        content_types = {
-            'pdf': 'application/pdf',
-            'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            'txt': 'text/plain',
-            'csv': 'text/csv',
-            'png': 'image/png',
-            'jpg': 'image/jpeg',
-            'jpeg': 'image/jpeg',
-            'gif': 'image/gif',
-            'bmp': 'image/bmp'
-        }
-        
-        return content_types.get(extension, 'application/octet-stream')
 
-# Global S3 service instance
-s3_service = S3Service()
\ No newline at end of file
+@lru_cache(maxsize=None)
+def get_s3_service() -> S3Service:
+    """Global S3 service instance, created on first use"""
+    return S3Service()
+
+def __getattr__(name):
+    # `from services.s3_service import s3_service` keeps working without constructing at import
+    if name == "s3_service":
+        return get_s3_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
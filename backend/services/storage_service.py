@@ -1,7 +1,14 @@
 import os
+import json
 import logging
+from functools import lru_cache
 from typing import Optional
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 class StorageService:
@@ -16,14 +23,14 @@ class StorageService:
                 logger.info("Using Google Cloud Storage (GCS) as storage provider")
             except Exception as e:
                 logger.error(f"Failed to initialize GCS, falling back to S3: {e}")
-                from .s3_service import s3_service
-                self.service = s3_service
+                from .s3_service import get_s3_service
+                self.service = get_s3_service()
                 self.storage_provider = "s3"
                 logger.info("Fallback: Using AWS S3 as storage provider")
         else:
             try:
-                from .s3_service import s3_service
-                self.service = s3_service
+                from .s3_service import get_s3_service
+                self.service = get_s3_service()
                 logger.info("Using AWS S3 as storage provider")
             except Exception as e:
                 logger.error(f"Failed to initialize S3: {e}")
@@ -63,15 +70,25 @@ class StorageService:
             return self.service.upload_metadata(metadata, filename, tenant_id)
         else:
             # Fallback for S3 - upload as JSON file
-            import json
             import uuid
-            metadata_json = json.dumps(metadata, indent=2)
+            if orjson is not None:
+                metadata_bytes = orjson.dumps(metadata, option=orjson.OPT_INDENT_2)
+            else:
+                metadata_bytes = json.dumps(metadata, indent=2).encode()
             unique_filename = f"{uuid.uuid4().hex}_metadata.json"
-            return self.service.upload_file(metadata_json.encode(), unique_filename, tenant_id)
+            return self.service.upload_file(metadata_bytes, unique_filename, tenant_id)
     
     def get_storage_provider(self) -> str:
         """Get current storage provider"""
         return self.storage_provider
 
-# Global storage service instance
-storage_service = StorageService()
\ No newline at end of file
+@lru_cache(maxsize=None)
+def get_storage_service() -> StorageService:
+    """Global storage service instance, created on first use"""
+    return StorageService()
+
+def __getattr__(name):
+    # Resolved on first access so importing this module doesn't pick and build a provider
+    if name == "storage_service":
+        return get_storage_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -5,17 +5,70 @@ without compromising response quality.
 """
 
 import time
-import statistics
+from bisect import bisect_left, bisect_right, insort
 from collections import defaultdict, deque
+from dataclasses import dataclass
 import logging
 
 logger = logging.getLogger(__name__)
 
+class RunningWindow:
+    """Last N samples with a running sum and a sorted copy, so stats never rescan the window"""
+    
+    def __init__(self, maxlen):
+        self.samples = deque(maxlen=maxlen)
+        self.sorted_samples = []
+        self.total = 0.0
+    
+    def __len__(self):
+        return len(self.samples)
+    
+    def append(self, value):
+        if len(self.samples) == self.samples.maxlen:
+            evicted = self.samples[0]
+            self.total -= evicted
+            del self.sorted_samples[bisect_left(self.sorted_samples, evicted)]
+        self.samples.append(value)
+        self.total += value
+        insort(self.sorted_samples, value)
+    
+    def mean(self):
+        return self.total / len(self.samples)
+    
+    def median(self):
+        n = len(self.sorted_samples)
+        middle = n // 2
+        if n % 2:
+            return self.sorted_samples[middle]
+        return (self.sorted_samples[middle - 1] + self.sorted_samples[middle]) / 2
+    
+    def min(self):
+        return self.sorted_samples[0]
+    
+    def max(self):
+        return self.sorted_samples[-1]
+    
+    def count_below(self, threshold):
+        return bisect_left(self.sorted_samples, threshold)
+    
+    def count_above(self, threshold):
+        return len(self.sorted_samples) - bisect_right(self.sorted_samples, threshold)
+
+SLOW_QUERY_HISTORY = 20
+
+@dataclass(slots=True)
+class SlowQueryRecord:
+    time: float
+    response_time: float
+    components: dict
+
 class SmartPerformanceMonitor:
     def __init__(self):
-        self.response_times = deque(maxlen=100)  # Keep last 100 responses
-        self.component_times = defaultdict(lambda: deque(maxlen=50))
-        self.slow_queries = deque(maxlen=20)  # Track slow queries for analysis
+        self.response_times = RunningWindow(maxlen=100)  # Keep last 100 responses
+        self.component_times = defaultdict(lambda: RunningWindow(maxlen=50))
+        # Ring buffer of the last SLOW_QUERY_HISTORY slow queries, for analysis
+        self.slow_queries = [None] * SLOW_QUERY_HISTORY
+        self._slow_query_index = 0
         
     def log_response_time(self, total_time_ms, components=None):
         """Log response time and component breakdown"""
@@ -27,38 +80,44 @@ class SmartPerformanceMonitor:
         
         # Track slow queries (>5 seconds)
         if total_time_ms > 5000:
-            self.slow_queries.append({
-                'time': time.time(),
-                'response_time': total_time_ms,
-                'components': components or {}
-            })
+            self.slow_queries[self._slow_query_index % SLOW_QUERY_HISTORY] = SlowQueryRecord(
+                time=time.time(),
+                response_time=total_time_ms,
+                components=components or {}
+            )
+            self._slow_query_index += 1
+    
+    def recent_slow_queries(self):
+        """Slow queries still in the ring buffer, newest first"""
+        count = min(self._slow_query_index, SLOW_QUERY_HISTORY)
+        return [self.slow_queries[(self._slow_query_index - 1 - i) % SLOW_QUERY_HISTORY] for i in range(count)]
     
     def get_performance_stats(self):
         """Get current performance statistics"""
         if not self.response_times:
             return {"status": "No data available"}
         
-        response_times_list = list(self.response_times)
+        response_times = self.response_times
         
         stats = {
-            "total_queries": len(response_times_list),
-            "avg_response_time_ms": statistics.mean(response_times_list),
-            "median_response_time_ms": statistics.median(response_times_list),
-            "min_response_time_ms": min(response_times_list),
-            "max_response_time_ms": max(response_times_list),
-            "slow_queries_count": len([t for t in response_times_list if t > 5000]),
-            "fast_queries_count": len([t for t in response_times_list if t < 2000]),
+            "total_queries": len(response_times),
+            "avg_response_time_ms": response_times.mean(),
+            "median_response_time_ms": response_times.median(),
+            "min_response_time_ms": response_times.min(),
+            "max_response_time_ms": response_times.max(),
+            "slow_queries_count": response_times.count_above(5000),
+            "fast_queries_count": response_times.count_below(2000),
         }
         
         # Component breakdown
         component_stats = {}
         for component, times in self.component_times.items():
             if times:
-                times_list = list(times)
+                avg_ms = times.mean()
                 component_stats[component] = {
-                    "avg_ms": statistics.mean(times_list),
-                    "max_ms": max(times_list),
-                    "percentage_of_total": (statistics.mean(times_list) / stats["avg_response_time_ms"]) * 100
+                    "avg_ms": avg_ms,
+                    "max_ms": times.max(),
+                    "percentage_of_total": (avg_ms / stats["avg_response_time_ms"]) * 100
                 }
         
         stats["component_breakdown"] = component_stats
@@ -5,19 +5,25 @@ Easily switch between S3 and GCS storage providers
 """
 
 import os
+import tempfile
 from pathlib import Path
 
+from utils.env_file import load_env
+
+S3_VARS = ['AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_BUCKET_NAME']
+GCS_VARS = ['GCS_PROJECT_ID', 'GCS_BUCKET_NAME', 'GCS_SERVICE_ACCOUNT_KEY']
+
+def _is_configured(env, variables):
+    """All variables set to a real value, not empty or a commented-out placeholder"""
+    return all(env.get(var) and not env[var].startswith('#') for var in variables)
+
 def get_current_provider():
     """Get current storage provider from .env file"""
-    env_file = Path(".env")
-    if not env_file.exists():
+    env = load_env(Path(".env"))
+    if env is None:
         return None
     
-    content = env_file.read_text()
-    for line in content.split('\n'):
-        if line.startswith('STORAGE_PROVIDER='):
-            return line.split('=', 1)[1].strip()
-    return None
+    return env.get('STORAGE_PROVIDER')
 
 def switch_to_provider(provider):
     """Switch to specified storage provider"""
@@ -26,6 +32,10 @@ def switch_to_provider(provider):
         print("❌ .env file not found!")
         return False
     
+    # Nothing to write if the provider is already selected
+    if get_current_provider() == provider:
+        return True
+    
     content = env_file.read_text()
     lines = content.split('\n')
     
@@ -41,13 +51,23 @@ def switch_to_provider(provider):
         # Add STORAGE_PROVIDER if not found
         lines.insert(0, f'STORAGE_PROVIDER={provider}')
     
-    # Write back to file
-    env_file.write_text('\n'.join(lines))
+    # Write back to file via a sibling temp file, so readers never see a half-written .env
+    fd, tmp_path = tempfile.mkstemp(dir=env_file.resolve().parent, prefix='.env.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as tmp_file:
+            tmp_file.write('\n'.join(lines))
+        os.chmod(tmp_path, os.stat(env_file).st_mode & 0o777)
+        os.replace(tmp_path, env_file)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
     return True
 
 def show_status():
     """Show current storage configuration status"""
-    current = get_current_provider()
+    # One parse answers both the provider and the configured checks
+    env = load_env(Path(".env"))
+    current = env.get('STORAGE_PROVIDER') if env is not None else None
     
     print("📊 Current Storage Configuration")
     print("=" * 40)
@@ -55,17 +75,9 @@ def show_status():
     print()
     
     # Check if required env vars are set
-    env_file = Path(".env")
-    if env_file.exists():
-        content = env_file.read_text()
-        
-        # Check S3 config
-        s3_vars = ['AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_BUCKET_NAME']
-        s3_configured = all(f'{var}=' in content and not content.split(f'{var}=')[1].split('\n')[0].strip().startswith('#') for var in s3_vars)
-        
-        # Check GCS config
-        gcs_vars = ['GCS_PROJECT_ID', 'GCS_BUCKET_NAME', 'GCS_SERVICE_ACCOUNT_KEY']
-        gcs_configured = all(f'{var}=' in content and not content.split(f'{var}=')[1].split('\n')[0].strip().startswith('#') for var in gcs_vars)
+    if env is not None:
+        s3_configured = _is_configured(env, S3_VARS)
+        gcs_configured = _is_configured(env, GCS_VARS)
         
         print("Configuration Status:")
         print(f"  S3:  {'✅ Configured' if s3_configured else '❌ Not configured'}")
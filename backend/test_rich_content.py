@@ -95,6 +95,26 @@ def test_summary_visualization():
     else:
         print("❌ No summary visualization generated")
 
+def test_time_series_extraction():
+    """Test that year series keep every point, as the per-type scans did"""
+    print("\n🧪 Testing time series extraction...")
+    
+    cases = [
+        ("Annual revenue 2021: 1,200 2022: 1,500", ["2021", "2022"], [1200.0, 1500.0]),
+        ("Revenue by year\n2020: 100\n2021: 150\n2022: 170", ["2020", "2021", "2022"], [100.0, 150.0, 170.0]),
+    ]
+    
+    for text, labels, values in cases:
+        data = rich_content_generator._extract_numerical_data(text)
+        series = [d for d in data if d["type"] == "time_series"]
+        assert len(series) == 1, f"expected one time series for {text!r}, got {data}"
+        assert series[0]["labels"] == labels, f"labels {series[0]['labels']} != {labels}"
+        assert series[0]["values"] == values, f"values {series[0]['values']} != {values}"
+        
+        charts = rich_content_generator.analyze_content_for_rich_elements(text, "show the trend").get("charts", [])
+        assert any(chart["type"] == "line" for chart in charts), f"no line chart for {text!r}"
+        print(f"✅ {len(labels)} points and a line chart for {text!r}")
+
 if __name__ == "__main__":
     print("🚀 Starting Rich Content Generation Tests\n")
     
@@ -102,6 +122,7 @@ if __name__ == "__main__":
         test_table_extraction()
         test_chart_generation()
         test_summary_visualization()
+        test_time_series_extraction()
         
         print("\n✅ All tests completed successfully!")
         
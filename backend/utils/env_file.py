@@ -0,0 +1,41 @@
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+# Last parsed .env, keyed by (path, inode, mtime, size) so an unchanged file isn't re-read;
+# a file replaced via os.replace gets a new inode even within the same mtime tick
+_ENV_CACHE = None
+
+def _unquote(value: str) -> str:
+    """Strip one pair of matching surrounding quotes, as load_dotenv does"""
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in ('"', "'"):
+        return value[1:-1]
+    return value
+
+def parse_env(content: str) -> Dict[str, str]:
+    """Parse .env content into a dict in one pass; the first assignment of a variable wins"""
+    env = {}
+    for line in content.splitlines():
+        key, sep, value = line.partition('=')
+        key = key.strip()
+        if key.startswith('export '):
+            key = key[len('export '):].strip()
+        if sep and key and not key.startswith('#') and key not in env:
+            env[key] = _unquote(value.strip())
+    return env
+
+def load_env(env_file: Path) -> Optional[Dict[str, str]]:
+    """Parsed .env contents, or None if the file is missing; reparsed only when the file changes"""
+    global _ENV_CACHE
+    try:
+        stat = os.stat(env_file)
+    except FileNotFoundError:
+        return None
+    
+    key = (str(env_file.resolve()), stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if _ENV_CACHE is not None and _ENV_CACHE[0] == key:
+        return _ENV_CACHE[1]
+    
+    env = parse_env(env_file.read_text())
+    _ENV_CACHE = (key, env)
+    return env
@@ -1,22 +1,83 @@
+import asyncio
 import io
+import os
 import logging
-from typing import Optional
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 import pandas as pd
 from docx import Document
 import PyPDF2
-from utils.ocr import ocr_service
+from utils.ocr import ocr_service, IMAGE_EXTENSIONS
 from services.gemini_multimodal import gemini_multimodal_service
 
 logger = logging.getLogger(__name__)
 
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+    logger.warning("pypdfium2 not available, PDF text extraction falls back to PyPDF2")
+
+try:
+    from charset_normalizer import from_bytes as detect_charset
+except ImportError:
+    detect_charset = None
+
+try:
+    import python_calamine  # noqa: F401 - pandas' native 'calamine' Excel engine
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_ENGINE = 'openpyxl'
+    logger.warning("python-calamine not available, Excel files are parsed with openpyxl")
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+    logger.warning("pyarrow not available, CSV files are parsed with pandas")
+
+# PDFium is not thread-safe and extraction runs on worker threads
+_pdfium_lock = threading.Lock()
+
+# Leading bytes sampled to guess the encoding of non-UTF-8 text files
+ENCODING_SAMPLE_BYTES = 64 * 1024
+
+# Rows of a CSV rendered into the extracted text: the first and last half, as DataFrame.to_string shows them
+CSV_PREVIEW_ROWS = 100
+CSV_BLOCK_SIZE = 1 << 20
+CSV_CHUNK_ROWS = 10_000  # pandas fallback reads the file in chunks of this many rows (> CSV_PREVIEW_ROWS)
+
+# Workbook sheets formatted concurrently
+EXCEL_SHEET_WORKERS = 8
+
+# Header line prepended to Gemini output, per media kind
+MEDIA_HEADERS = {
+    'video': "Content processed with AI video analysis including transcription and visual description.",
+    'audio': "Content processed with AI audio analysis and transcription.",
+    'image': "Content processed with AI image analysis including OCR and visual description.",
+}
+
+def _write_pdf_page(buffer: io.StringIO, page_num: int, page_text: str):
+    """Append a non-blank page as "[Page N]" + text, pages separated by a blank line"""
+    if not page_text or not page_text.strip():
+        return
+    if buffer.tell():
+        buffer.write("\n\n")
+    buffer.write(f"[Page {page_num + 1}]\n")
+    buffer.write(page_text)
+
 class FileProcessor:
     def __init__(self):
-        self.supported_extensions = {
+        self.supported_extensions = frozenset({
             '.pdf', '.docx', '.txt', '.csv', '.xlsx', '.xls',
             '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp',
             '.mp4', '.avi', '.mov', '.mkv', '.webm', '.flv',
             '.mp3', '.wav', '.m4a', '.flac', '.aac', '.ogg'
-        }
+        })
         
         # Logistics-specific Excel sheet patterns
         self.logistics_sheet_patterns = [
@@ -24,65 +85,131 @@ class FileProcessor:
             'tracking', 'route', 'schedule', 'cargo', 'transport',
             'warehouse', 'dispatch', 'driver', 'vehicle', 'load'
         ]
+        self._logistics_sheet_re = re.compile('|'.join(map(re.escape, self.logistics_sheet_patterns)), re.IGNORECASE)
+        
+        # Extension -> extractor, all taking (file_content, filename). Gemini image
+        # entries come after OCR ones so Gemini wins for the types both handle.
+        self._handlers = {
+            '.pdf': self._extract_from_pdf,
+            '.docx': self._extract_from_docx,
+            '.txt': self._extract_from_txt,
+            '.csv': self._extract_from_csv,
+            '.xlsx': self._extract_from_excel,
+            '.xls': self._extract_from_excel,
+            **{ext: self._extract_from_image for ext in IMAGE_EXTENSIONS},
+            **{ext: self._extract_from_gemini_image for ext in gemini_multimodal_service.supported_image_formats},
+            **{ext: self._extract_from_audio for ext in gemini_multimodal_service.supported_audio_formats},
+            **{ext: self._extract_from_video for ext in gemini_multimodal_service.supported_video_formats},
+        }
+        
+        self._sheet_pool = ThreadPoolExecutor(max_workers=EXCEL_SHEET_WORKERS, thread_name_prefix="excel-sheet")
     
     def is_supported_file(self, filename: str) -> bool:
         """Check if file type is supported"""
-        return any(filename.lower().endswith(ext) for ext in self.supported_extensions)
+        return self._get_file_extension(filename) in self.supported_extensions
     
     def extract_text(self, filename: str, file_content: bytes) -> Optional[str]:
         """Extract text from various file types"""
         try:
             file_extension = self._get_file_extension(filename)
             
-            if file_extension == '.pdf':
-                return self._extract_from_pdf(file_content)
-            elif file_extension == '.docx':
-                return self._extract_from_docx(file_content)
-            elif file_extension == '.txt':
-                return self._extract_from_txt(file_content)
-            elif file_extension == '.csv':
-                return self._extract_from_csv(file_content)
-            elif file_extension in ['.xlsx', '.xls']:
-                return self._extract_from_excel(file_content, filename)
-            elif gemini_multimodal_service.is_video_file(filename):
-                return self._extract_from_video(file_content, filename)
-            elif gemini_multimodal_service.is_audio_file(filename):
-                return self._extract_from_audio(file_content, filename)
-            elif gemini_multimodal_service.is_supported_image(filename):
-                return self._extract_from_gemini_image(file_content, filename)
-            elif ocr_service.is_image_file(filename):
-                return self._extract_from_image(file_content)
-            else:
+            handler = self._handlers.get(file_extension)
+            if handler is None:
                 logger.warning(f"Unsupported file type: {file_extension}")
                 return None
+            return handler(file_content, filename)
                 
         except Exception as e:
             logger.error(f"Text extraction failed for {filename}: {e}")
             return None
     
+    async def extract_text_batch(self, files: List[Tuple[str, bytes]]) -> List[Optional[str]]:
+        """Extract text from several (filename, file_content) pairs, in input order.
+        
+        Gemini-handled media go to gemini_multimodal_service as one concurrent batch
+        while documents are parsed on worker threads alongside it, so a bulk ingest
+        overlaps CPU-bound parsing with the network-bound Gemini calls.
+        """
+        results: List[Optional[str]] = [None] * len(files)
+        kinds = [gemini_multimodal_service.classify(filename) for filename, _ in files]
+        media_indices = [index for index, kind in enumerate(kinds) if kind is not None]
+        
+        async def run_media():
+            media_results = await gemini_multimodal_service.process_any(
+                [(files[index][1], files[index][0]) for index in media_indices])
+            for index, result in zip(media_indices, media_results):
+                filename, file_content = files[index]
+                if result:
+                    results[index] = self._with_media_header(kinds[index], filename, result)
+                elif kinds[index] == 'image':
+                    # Fallback to traditional OCR if Gemini fails
+                    results[index] = await asyncio.to_thread(self._extract_from_image, file_content, filename)
+                else:
+                    logger.warning(f"No content extracted from {kinds[index]}: {filename}")
+        
+        async def run_document(index: int, filename: str, file_content: bytes):
+            results[index] = await asyncio.to_thread(self.extract_text, filename, file_content)
+        
+        async with asyncio.TaskGroup() as tg:
+            if media_indices:
+                tg.create_task(run_media())
+            for index, (filename, file_content) in enumerate(files):
+                if kinds[index] is None:
+                    tg.create_task(run_document(index, filename, file_content))
+        
+        return results
+    
+    def _with_media_header(self, kind: str, filename: str, result: str) -> str:
+        """Prefix Gemini output with the file's media kind and how it was processed"""
+        return f"[{kind.upper()} FILE: {filename}]\n{MEDIA_HEADERS[kind]}\n\n{result}"
+    
     def _get_file_extension(self, filename: str) -> str:
         """Get file extension in lowercase"""
-        return '.' + filename.split('.')[-1].lower() if '.' in filename else ''
+        return os.path.splitext(filename)[1].lower()
     
-    def _extract_from_pdf(self, file_content: bytes) -> Optional[str]:
+    def _extract_from_pdf(self, file_content: bytes, filename: str) -> Optional[str]:
         """Extract text from PDF"""
+        if pdfium is not None:
+            return self._extract_from_pdf_pdfium(file_content, filename)
+        
         try:
             pdf_file = io.BytesIO(file_content)
             pdf_reader = PyPDF2.PdfReader(pdf_file)
             
-            text_content = []
+            text_content = io.StringIO()
             for page_num, page in enumerate(pdf_reader.pages):
-                page_text = page.extract_text()
-                if page_text.strip():
-                    text_content.append(f"[Page {page_num + 1}]\n{page_text}")
+                _write_pdf_page(text_content, page_num, page.extract_text())
             
-            return "\n\n".join(text_content) if text_content else None
+            return text_content.getvalue() or None
+            
+        except Exception as e:
+            logger.error(f"PDF extraction failed for {filename}: {e}")
+            return None
+    
+    def _extract_from_pdf_pdfium(self, file_content: bytes, filename: str) -> Optional[str]:
+        """Extract text from PDF with PDFium's native text layer"""
+        try:
+            text_content = io.StringIO()
+            with _pdfium_lock:
+                pdf = pdfium.PdfDocument(file_content)
+                try:
+                    for page_num in range(len(pdf)):
+                        page = pdf[page_num]
+                        textpage = page.get_textpage()
+                        page_text = textpage.get_text_range()
+                        textpage.close()
+                        page.close()
+                        _write_pdf_page(text_content, page_num, page_text.replace('\r\n', '\n'))
+                finally:
+                    pdf.close()
+            
+            return text_content.getvalue() or None
             
         except Exception as e:
-            logger.error(f"PDF extraction failed: {e}")
+            logger.error(f"PDF extraction failed for {filename}: {e}")
             return None
     
-    def _extract_from_docx(self, file_content: bytes) -> Optional[str]:
+    def _extract_from_docx(self, file_content: bytes, filename: str) -> Optional[str]:
         """Extract text from DOCX"""
         try:
             doc_file = io.BytesIO(file_content)
@@ -96,55 +223,121 @@ class FileProcessor:
             return "\n\n".join(text_content) if text_content else None
             
         except Exception as e:
-            logger.error(f"DOCX extraction failed: {e}")
+            logger.error(f"DOCX extraction failed for {filename}: {e}")
             return None
     
-    def _extract_from_txt(self, file_content: bytes) -> Optional[str]:
+    def _extract_from_txt(self, file_content: bytes, filename: str) -> Optional[str]:
         """Extract text from TXT"""
         try:
-            # Try different encodings
-            encodings = ['utf-8', 'latin-1', 'cp1252']
+            try:
+                text = file_content.decode('utf-8')
+            except UnicodeDecodeError:
+                # Guess from a sample instead of re-decoding the whole file per candidate
+                text = file_content.decode(self._detect_encoding(file_content), errors='replace')
             
-            for encoding in encodings:
-                try:
-                    text = file_content.decode(encoding)
-                    return text.strip() if text.strip() else None
-                except UnicodeDecodeError:
-                    continue
-            
-            logger.warning("Could not decode text file with any encoding")
-            return None
+            return text.strip() if text.strip() else None
             
         except Exception as e:
-            logger.error(f"TXT extraction failed: {e}")
+            logger.error(f"TXT extraction failed for {filename}: {e}")
             return None
     
-    def _extract_from_csv(self, file_content: bytes) -> Optional[str]:
+    def _detect_encoding(self, file_content: bytes) -> str:
+        """Best-guess encoding for non-UTF-8 text, latin-1 when undetectable"""
+        if detect_charset is not None:
+            best = detect_charset(file_content[:ENCODING_SAMPLE_BYTES]).best()
+            if best is not None:
+                return best.encoding
+        return 'latin-1'
+    
+    def _extract_from_csv(self, file_content: bytes, filename: str) -> Optional[str]:
         """Extract text from CSV"""
         try:
-            csv_file = io.BytesIO(file_content)
-            df = pd.read_csv(csv_file)
+            df, row_count = None, 0
+            if pa is not None:
+                try:
+                    df, row_count = self._read_csv_preview_arrow(file_content)
+                except pa.ArrowException as e:
+                    logger.warning(f"Arrow CSV parsing failed for {filename}, retrying with pandas: {e}")
+            if df is None:
+                df, row_count = self._read_csv_preview_pandas(file_content)
             
             # Convert DataFrame to readable text format
             text_content = []
-            text_content.append(f"CSV Data with {len(df)} rows and {len(df.columns)} columns")
-            text_content.append(f"Columns: {', '.join(df.columns.tolist())}")
+            text_content.append(f"CSV Data with {row_count} rows and {len(df.columns)} columns")
+            text_content.append(f"Columns: {', '.join(map(str, df.columns))}")
             text_content.append("\nData Summary:")
-            text_content.append(df.to_string(max_rows=100))  # Limit to first 100 rows
+            text_content.append(df.to_string(max_rows=CSV_PREVIEW_ROWS))  # Limit to first and last 50 rows
             
             return "\n\n".join(text_content)
             
         except Exception as e:
-            logger.error(f"CSV extraction failed: {e}")
+            logger.error(f"CSV extraction failed for {filename}: {e}")
             return None
     
+    def _read_csv_preview_arrow(self, file_content: bytes):
+        """The rows to_string(max_rows=CSV_PREVIEW_ROWS) shows, as a DataFrame, plus the total row count.
+        
+        Only the leading batches and a rolling window of trailing batches are kept; the rest
+        are counted and dropped, so memory stays bounded by a few parse blocks.
+        """
+        reader = pa_csv.open_csv(
+            io.BytesIO(file_content),
+            read_options=pa_csv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+            # Empty cells and NA markers are missing values in text columns too, as in pandas
+            convert_options=pa_csv.ConvertOptions(strings_can_be_null=True)
+        )
+        tail_size = CSV_PREVIEW_ROWS // 2
+        head_batches, tail_batches = [], deque()
+        head_rows = tail_rows = row_count = 0
+        for batch in reader:
+            if head_rows <= CSV_PREVIEW_ROWS:
+                head_batches.append(batch)
+                head_rows += batch.num_rows
+            else:
+                tail_batches.append(batch)
+                tail_rows += batch.num_rows
+                while tail_rows - tail_batches[0].num_rows >= tail_size:
+                    tail_rows -= tail_batches.popleft().num_rows
+            row_count += batch.num_rows
+        
+        table = pa.Table.from_batches(head_batches + list(tail_batches), schema=reader.schema)
+        if row_count <= CSV_PREVIEW_ROWS + 1:
+            df = table.to_pandas()
+        else:
+            # One row past the first half makes to_string elide the middle exactly as for the full
+            # frame; the last half keeps its real row numbers
+            preview = pa.concat_tables([table.slice(0, tail_size + 1), table.slice(table.num_rows - tail_size)])
+            df = preview.to_pandas()
+            df.index = pd.RangeIndex(tail_size + 1).append(pd.RangeIndex(row_count - tail_size, row_count))
+        
+        # Arrow hands text-column nulls to pandas as None; pandas itself reads them as NaN
+        return df.fillna(float('nan')), row_count
+    
+    def _read_csv_preview_pandas(self, file_content: bytes):
+        """Same preview as _read_csv_preview_arrow, from a chunked pandas read"""
+        tail_size = CSV_PREVIEW_ROWS // 2
+        head, recent = None, []
+        row_count = 0
+        for chunk in pd.read_csv(io.BytesIO(file_content), chunksize=CSV_CHUNK_ROWS):
+            if head is None:
+                head = chunk
+            # The last chunk can be short, so the one before it is kept as well
+            recent = [*recent[-1:], chunk]
+            row_count += len(chunk)
+        
+        if row_count <= CSV_PREVIEW_ROWS + 1:
+            return head, row_count
+        # Chunks carry their row numbers in the index, so the halves line up as in the full frame
+        df = pd.concat([head.iloc[:tail_size + 1], pd.concat(recent).iloc[-tail_size:]])
+        return df, row_count
+    
     def _extract_from_excel(self, file_content: bytes, filename: str) -> Optional[str]:
         """Extract text from Excel files (.xlsx, .xls) with row-wise formatting"""
         try:
             excel_file = io.BytesIO(file_content)
             
             # Read all sheets from the Excel file
-            excel_data = pd.read_excel(excel_file, sheet_name=None, engine='openpyxl')
+            excel_data = pd.read_excel(excel_file, sheet_name=None, engine=EXCEL_ENGINE)
             
             if not excel_data:
                 logger.warning(f"No sheets found in Excel file: {filename}")
@@ -154,51 +347,12 @@ class FileProcessor:
             text_content.append(f"Excel File: {filename}")
             text_content.append(f"Total Sheets: {len(excel_data)}")
             
-            # Process each sheet
-            for sheet_name, df in excel_data.items():
-                if df.empty:
-                    continue
-                
-                # Check if this is a logistics-related sheet
-                is_logistics_sheet = any(pattern in sheet_name.lower() 
-                                       for pattern in self.logistics_sheet_patterns)
-                
-                sheet_info = []
-                sheet_info.append(f"\n{'='*50}")
-                sheet_info.append(f"SHEET: {sheet_name}")
-                
-                if is_logistics_sheet:
-                    sheet_info.append("📦 LOGISTICS DATA DETECTED")
-                
-                sheet_info.append(f"Dimensions: {len(df)} rows × {len(df.columns)} columns")
-                sheet_info.append(f"Columns: {', '.join(df.columns.astype(str).tolist())}")
-                sheet_info.append(f"{'='*50}")
-                
-                # Add data in row-wise format for better RAG processing
-                sheet_info.append("\nSAMPLE RECORDS:")
-                
-                # Clean and format the data row by row
-                df_clean = df.fillna('')  # Replace NaN with empty string
-                
-                # Create row-wise records (each row as a complete record)
-                for idx, row in df_clean.head(50).iterrows():  # Limit to first 50 rows
-                    record_parts = []
-                    for col, value in row.items():
-                        if pd.notna(value) and str(value).strip():
-                            record_parts.append(f"{col}={value}")
-                    
-                    if record_parts:
-                        sheet_info.append(f"Record {idx + 1}: {' | '.join(record_parts)}")
-                
-                # Add summary statistics for numeric columns
-                numeric_cols = df.select_dtypes(include=['number']).columns
-                if len(numeric_cols) > 0:
-                    sheet_info.append(f"\nNUMERIC SUMMARY:")
-                    for col in numeric_cols[:5]:  # Limit to first 5 numeric columns
-                        col_data = df[col].dropna()
-                        if len(col_data) > 0:
-                            sheet_info.append(f"{col}: Min={col_data.min():.2f}, Max={col_data.max():.2f}, Avg={col_data.mean():.2f}")
-                
+            # Process each sheet, fanning out across the pool when there are several
+            if len(excel_data) > 1:
+                sheets = self._sheet_pool.map(self._process_sheet, excel_data.items())
+            else:
+                sheets = map(self._process_sheet, excel_data.items())
+            for sheet_info in sheets:
                 text_content.extend(sheet_info)
             
             return "\n".join(text_content) if text_content else None
@@ -207,62 +361,59 @@ class FileProcessor:
             logger.error(f"Excel extraction failed for {filename}: {e}")
             return None
     
-    def _format_logistics_data(self, df, sheet_name: str) -> str:
-        """Format logistics-specific data for better readability"""
-        try:
-            formatted_lines = []
-            
-            # Identify key logistics columns
-            logistics_columns = {
-                'tracking': ['tracking', 'track', 'id', 'number', 'ref'],
-                'status': ['status', 'state', 'condition'],
-                'location': ['location', 'address', 'city', 'destination', 'origin'],
-                'date': ['date', 'time', 'schedule', 'eta', 'delivery'],
-                'quantity': ['qty', 'quantity', 'count', 'amount', 'weight'],
-                'item': ['item', 'product', 'cargo', 'goods', 'description']
-            }
-            
-            # Map actual columns to logistics categories
-            column_mapping = {}
-            for category, keywords in logistics_columns.items():
-                for col in df.columns:
-                    if any(keyword in col.lower() for keyword in keywords):
-                        if category not in column_mapping:
-                            column_mapping[category] = []
-                        column_mapping[category].append(col)
-            
-            # Format data based on identified structure
-            if column_mapping:
-                formatted_lines.append("🚚 LOGISTICS DATA STRUCTURE:")
-                for category, cols in column_mapping.items():
-                    formatted_lines.append(f"  {category.upper()}: {', '.join(cols)}")
-                formatted_lines.append("")
-            
-            # Show sample records in a logistics-friendly format
-            formatted_lines.append("📋 SAMPLE RECORDS:")
-            for idx, row in df.head(10).iterrows():
-                record_line = f"Record {idx + 1}: "
-                record_parts = []
-                
-                for col, value in row.items():
-                    if pd.notna(value) and str(value).strip():
-                        record_parts.append(f"{col}={value}")
-                
-                if record_parts:
-                    formatted_lines.append(record_line + " | ".join(record_parts[:6]))  # Limit to 6 fields per line
-            
-            return "\n".join(formatted_lines)
-            
-        except Exception as e:
-            logger.error(f"Logistics formatting failed: {e}")
-            return df.to_string(max_rows=20)
+    def _process_sheet(self, sheet) -> List[str]:
+        """Format one (sheet_name, DataFrame) pair of a workbook"""
+        sheet_name, df = sheet
+        if df.empty:
+            return []
+        
+        # Check if this is a logistics-related sheet
+        is_logistics_sheet = self._logistics_sheet_re.search(str(sheet_name)) is not None
+        
+        sheet_info = []
+        sheet_info.append(f"\n{'='*50}")
+        sheet_info.append(f"SHEET: {sheet_name}")
+        
+        if is_logistics_sheet:
+            sheet_info.append("📦 LOGISTICS DATA DETECTED")
+        
+        sheet_info.append(f"Dimensions: {len(df)} rows × {len(df.columns)} columns")
+        sheet_info.append(f"Columns: {', '.join(df.columns.astype(str).tolist())}")
+        sheet_info.append(f"{'='*50}")
+        
+        # Add data in row-wise format for better RAG processing
+        sheet_info.append("\nSAMPLE RECORDS:")
+        
+        # Clean and format the data row by row
+        df_clean = df.fillna('')  # Replace NaN with empty string
+        
+        # Create row-wise records (each row as a complete record), built column-wise
+        head = df_clean.head(50)  # Limit to first 50 rows
+        sample = head.astype(object).astype(str)
+        filled = head.notna() & sample.apply(lambda col: col.str.strip().ne(''))
+        parts = sample.apply(lambda col: f"{col.name}=" + col).where(filled, '')
+        for idx, row in zip(sample.index, parts.values.tolist()):
+            record_parts = [part for part in row if part]
+            if record_parts:
+                sheet_info.append(f"Record {idx + 1}: {' | '.join(record_parts)}")
+        
+        # Add summary statistics for numeric columns
+        numeric_cols = df.select_dtypes(include=['number']).columns[:5]  # Limit to first 5 numeric columns
+        if len(numeric_cols) > 0:
+            sheet_info.append(f"\nNUMERIC SUMMARY:")
+            stats = df[numeric_cols].agg(['count', 'min', 'max', 'mean'])
+            for col in numeric_cols:
+                if stats.at['count', col] > 0:
+                    sheet_info.append(f"{col}: Min={stats.at['min', col]:.2f}, Max={stats.at['max', col]:.2f}, Avg={stats.at['mean', col]:.2f}")
+        
+        return sheet_info
     
-    def _extract_from_image(self, file_content: bytes) -> Optional[str]:
+    def _extract_from_image(self, file_content: bytes, filename: str) -> Optional[str]:
         """Extract text from image using OCR"""
         try:
             return ocr_service.extract_text_from_image(file_content)
         except Exception as e:
-            logger.error(f"Image OCR failed: {e}")
+            logger.error(f"Image OCR failed for {filename}: {e}")
             return None
     
     def _extract_from_video(self, file_content: bytes, filename: str) -> Optional[str]:
@@ -272,10 +423,7 @@ class FileProcessor:
             result = gemini_multimodal_service.process_video_file(file_content, filename)
             
             if result:
-                # Add video processing metadata
-                metadata_header = f"[VIDEO FILE: {filename}]\n"
-                metadata_header += "Content processed with AI video analysis including transcription and visual description.\n\n"
-                return metadata_header + result
+                return self._with_media_header('video', filename, result)
             else:
                 logger.warning(f"No content extracted from video: {filename}")
                 return None
@@ -291,10 +439,7 @@ class FileProcessor:
             result = gemini_multimodal_service.process_audio_file(file_content, filename)
             
             if result:
-                # Add audio processing metadata
-                metadata_header = f"[AUDIO FILE: {filename}]\n"
-                metadata_header += "Content processed with AI audio analysis and transcription.\n\n"
-                return metadata_header + result
+                return self._with_media_header('audio', filename, result)
             else:
                 logger.warning(f"No content extracted from audio: {filename}")
                 return None
@@ -310,19 +455,16 @@ class FileProcessor:
             result = gemini_multimodal_service.process_image_file(file_content, filename)
             
             if result:
-                # Add image processing metadata
-                metadata_header = f"[IMAGE FILE: {filename}]\n"
-                metadata_header += "Content processed with AI image analysis including OCR and visual description.\n\n"
-                return metadata_header + result
+                return self._with_media_header('image', filename, result)
             else:
                 logger.warning(f"No content extracted from image with Gemini: {filename}")
                 # Fallback to traditional OCR if Gemini fails
-                return self._extract_from_image(file_content)
+                return self._extract_from_image(file_content, filename)
                 
         except Exception as e:
             logger.error(f"Gemini image extraction failed for {filename}: {e}")
             # Fallback to traditional OCR
-            return self._extract_from_image(file_content)
+            return self._extract_from_image(file_content, filename)
 
 # Global file processor instance
 file_processor = FileProcessor()
\ No newline at end of file
@@ -1,11 +1,17 @@
 import pytesseract
 from PIL import Image
 import io
+import os
 import logging
 from typing import Optional
 
 logger = logging.getLogger(__name__)
 
+IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff'})
+
+# LSTM engine only; page segmentation stays on tesseract's automatic default
+TESSERACT_CONFIG = '--oem 1'
+
 class OCRService:
     def __init__(self):
         # Configure tesseract path if needed (Windows)
@@ -16,13 +22,20 @@ class OCRService:
         """Extract text from image using OCR"""
         try:
             image = Image.open(io.BytesIO(image_bytes))
-            
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+        except Exception as e:
+            logger.error(f"OCR extraction failed: {e}")
+            return None
+        return self.extract_text_from_pil(image)
+    
+    def extract_text_from_pil(self, image: Image.Image) -> Optional[str]:
+        """Extract text from an already decoded PIL image using OCR"""
+        try:
+            # Tesseract binarizes internally; grayscale is a third of the pixels to hand over
+            if image.mode != 'L':
+                image = image.convert('L')
             
             # Extract text using tesseract
-            text = pytesseract.image_to_string(image, lang='eng')
+            text = pytesseract.image_to_string(image, lang='eng', config=TESSERACT_CONFIG)
             
             # Clean up the text
             text = text.strip()
@@ -39,8 +52,7 @@ class OCRService:
     
     def is_image_file(self, filename: str) -> bool:
         """Check if file is an image"""
-        image_extensions = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff'}
-        return any(filename.lower().endswith(ext) for ext in image_extensions)
+        return os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
 
 # Global OCR service instance
 ocr_service = OCRService()
\ No newline at end of file
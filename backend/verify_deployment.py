@@ -5,12 +5,26 @@ Deployment verification script for Enterprise RAG Backend
 
 import sys
 import os
-from dotenv import load_dotenv
+import importlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+
+from utils.env_file import load_env
+
+# Imported together so their .pyc reads and native library loads overlap
+CRITICAL_MODULES = [
+    'fastapi',
+    'uvicorn',
+    'pymongo',
+    'pinecone',
+    'langchain',
+    'google.generativeai',
+    'email_validator',  # Required for pydantic EmailStr
+    'pydantic'
+]
 
 def verify_environment():
     """Verify all required environment variables are set"""
-    load_dotenv()
-    
     required_vars = [
         'MONGODB_URL',
         'PINECONE_API_KEY', 
@@ -19,10 +33,11 @@ def verify_environment():
         'SECRET_KEY'
     ]
     
-    missing_vars = []
-    for var in required_vars:
-        if not os.getenv(var):
-            missing_vars.append(var)
+    # Real environment first, like load_dotenv; the .env file is only parsed if it falls short
+    missing_vars = [var for var in required_vars if not os.getenv(var)]
+    if missing_vars:
+        env = load_env(Path(__file__).resolve().parent / ".env") or {}
+        missing_vars = [var for var in missing_vars if not env.get(var)]
     
     if missing_vars:
         print(f"❌ Missing required environment variables: {', '.join(missing_vars)}")
@@ -33,20 +48,33 @@ def verify_environment():
 
 def verify_imports():
     """Verify all critical imports work"""
-    try:
-        import fastapi
-        import uvicorn
-        import pymongo
-        import pinecone
-        import langchain
-        import google.generativeai
-        import email_validator  # Required for pydantic EmailStr
-        from pydantic import EmailStr  # Test EmailStr import
-        print("✅ All critical imports successful")
-        return True
-    except ImportError as e:
-        print(f"❌ Import error: {e}")
+    with ThreadPoolExecutor(max_workers=len(CRITICAL_MODULES)) as pool:
+        futures = {name: pool.submit(importlib.import_module, name) for name in CRITICAL_MODULES}
+        wait(futures.values())
+    
+    # Concurrent imports of interdependent packages can hit each other's partially initialized
+    # modules, so a module that failed in parallel is retried serially before it counts
+    errors = []
+    for name, future in futures.items():
+        if future.exception() is not None:
+            try:
+                importlib.import_module(name)
+            except ImportError as e:
+                errors.append(e)
+    
+    if not errors:
+        try:
+            from pydantic import EmailStr  # Test EmailStr import
+        except ImportError as e:
+            errors.append(e)
+    
+    if errors:
+        for e in errors:
+            print(f"❌ Import error: {e}")
         return False
+    
+    print("✅ All critical imports successful")
+    return True
 
 def main():
     print("🔍 Verifying deployment...")
@@ -19,7 +19,7 @@ const RichContentRenderer = ({ richContent, onImageDownload }) => {
               </h4>
             </div>
             <button
-              onClick={() => onImageDownload && onImageDownload(richContent.summary_visualization.image, richContent.summary_visualization.title)}
+              onClick={() => onImageDownload && onImageDownload(richContent.summary_visualization.image, richContent.summary_visualization.title, richContent.summary_visualization.mime_type)}
               className="text-blue-600 hover:text-blue-800 p-1"
               title="Download chart"
             >
@@ -28,7 +28,7 @@ const RichContentRenderer = ({ richContent, onImageDownload }) => {
           </div>
           <div className="bg-white p-3 rounded border">
             <img
-              src={`data:image/png;base64,${richContent.summary_visualization.image}`}
+              src={`data:${richContent.summary_visualization.mime_type || 'image/png'};base64,${richContent.summary_visualization.image}`}
               alt={richContent.summary_visualization.title}
               className="w-full h-auto max-w-full"
             />
@@ -101,7 +101,7 @@ const RichContentRenderer = ({ richContent, onImageDownload }) => {
               </span>
             </div>
             <button
-              onClick={() => onImageDownload && onImageDownload(chart.image, chart.title)}
+              onClick={() => onImageDownload && onImageDownload(chart.image, chart.title, chart.mime_type)}
               className="text-green-600 hover:text-green-800 p-1"
               title="Download chart"
             >
@@ -111,7 +111,7 @@ const RichContentRenderer = ({ richContent, onImageDownload }) => {
           
           <div className="bg-white p-3 rounded border">
             <img
-              src={`data:image/png;base64,${chart.image}`}
+              src={`data:${chart.mime_type || 'image/png'};base64,${chart.image}`}
               alt={chart.title}
               className="w-full h-auto max-w-full"
             />
@@ -240,7 +240,7 @@ const Chat = () => {
     }
   }
 
-  const handleImageDownload = (base64Image, fileName) => {
+  const handleImageDownload = (base64Image, fileName, mimeType = 'image/png') => {
     try {
       // Convert base64 to blob
       const byteCharacters = atob(base64Image)
@@ -249,13 +249,13 @@ const Chat = () => {
         byteNumbers[i] = byteCharacters.charCodeAt(i)
       }
       const byteArray = new Uint8Array(byteNumbers)
-      const blob = new Blob([byteArray], { type: 'image/png' })
+      const blob = new Blob([byteArray], { type: mimeType })
 
       // Create download link
       const url = window.URL.createObjectURL(blob)
       const link = document.createElement('a')
       link.href = url
-      link.download = `${fileName.replace(/[^a-z0-9]/gi, '_').toLowerCase()}.png`
+      link.download = `${fileName.replace(/[^a-z0-9]/gi, '_').toLowerCase()}.${mimeType.split('/')[1]}`
       document.body.appendChild(link)
       link.click()
       document.body.removeChild(link)